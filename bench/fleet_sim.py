@@ -0,0 +1,365 @@
+"""
+Giả lập cả fleet trên một máy Linux thường để đo vòng monitor của rejoin_webhook.py.
+
+Gồm 3 phần chạy local:
+- Fake Roblox API (presence + users) với latency, lỗi 5xx và 429 tùy chỉnh
+- Fake Discord webhook nhận và đếm message
+- Các lệnh am/pm/screencap/termux-wake-lock giả trên PATH, ghi lại từng lần gọi
+
+Ví dụ:
+    python bench/fleet_sim.py --instances 50 200 500 --duration 60
+    python bench/fleet_sim.py --instances 200 --error-rate 0.05 --rate-429 0.05 --json result.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import stat
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psutil
+from aiohttp import web
+from rich.table import Table
+from rich import box
+
+import rejoin_webhook as rw
+
+PLACE_ID = "2753915549"
+OTHER_PLACE_ID = 126884695634066
+
+
+class FakeRobloxApi:
+    """Presence/users API giả: mỗi user có xác suất offline hoặc sai map ở mỗi lần hỏi."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, rate_429: float,
+                 offline_rate: float, wrong_place_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.offline_rate = offline_rate
+        self.wrong_place_rate = wrong_place_rate
+        self.stats = {'requests': 0, 'users': 0, 'errors': 0, 'throttled': 0}
+
+    async def delay(self):
+        await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def presence(self, user_id: int) -> Dict:
+        roll = random.random()
+        if roll < self.offline_rate:
+            return {'userId': user_id, 'userPresenceType': 0, 'rootPlaceId': None}
+        if roll < self.offline_rate + self.wrong_place_rate:
+            return {'userId': user_id, 'userPresenceType': 2, 'rootPlaceId': OTHER_PLACE_ID}
+        return {'userId': user_id, 'userPresenceType': 2, 'rootPlaceId': int(PLACE_ID)}
+
+    async def handle_presence(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        await self.delay()
+        roll = random.random()
+        if roll < self.rate_429:
+            self.stats['throttled'] += 1
+            return web.json_response({'errors': [{'message': "Too many requests"}]}, status=429,
+                                     headers={'Retry-After': "1"})
+        if roll < self.rate_429 + self.error_rate:
+            self.stats['errors'] += 1
+            return web.json_response({'errors': [{'message': "Internal error"}]}, status=500)
+
+        try:
+            payload = await request.json()
+        except ConnectionResetError:
+            # Client huỷ request lúc dừng monitor
+            return web.Response(status=499)
+        user_ids = payload.get('userIds', [])
+        self.stats['users'] += len(user_ids)
+        return web.json_response({'userPresences': [self.presence(user_id) for user_id in user_ids]})
+
+    async def handle_authenticated(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        await self.delay()
+        cookie = request.headers.get('Cookie', '')
+        user_id = int(cookie.rsplit('_', 1)[-1]) if cookie.rsplit('_', 1)[-1].isdigit() else 1
+        return web.json_response({'id': user_id, 'name': f"sim_user_{user_id}"})
+
+
+class FakeDiscordSink:
+    """Webhook Discord giả, trả 204 như Discord thật và đếm message/ảnh nhận được."""
+
+    def __init__(self):
+        self.stats = {'messages': 0, 'attachments': 0, 'bytes': 0}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        self.stats['messages'] += 1
+        self.stats['bytes'] += len(body)
+        if request.content_type.startswith('multipart/'):
+            self.stats['attachments'] += 1
+        return web.Response(status=204)
+
+
+def tiny_png() -> bytes:
+    if rw.Image is not None:
+        buffer = io.BytesIO()
+        rw.Image.new("RGB", (1280, 720), (40, 120, 200)).save(buffer, format="PNG")
+        return buffer.getvalue()
+    # PNG 1x1 khi không có Pillow
+    return bytes.fromhex(
+        "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+        "0000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+    )
+
+
+def install_shims(shim_dir: Path, calls_log: Path):
+    """Tạo am/pm/screencap/termux-wake-lock giả, mỗi lần gọi ghi một dòng vào calls_log."""
+    screenshot = shim_dir / "screenshot.png"
+    screenshot.write_bytes(tiny_png())
+    scripts = {
+        "am": 'echo "am $*" >> "{log}"\necho "Starting: Intent"\n',
+        "pm": 'echo "pm $*" >> "{log}"\necho "package:com.roblox.client"\n',
+        "screencap": 'echo "screencap $*" >> "{log}"\ncat "{shot}"\n',
+        "termux-wake-lock": 'echo "termux-wake-lock" >> "{log}"\n',
+    }
+    for name, body in scripts.items():
+        path = shim_dir / name
+        path.write_text("#!/bin/sh\n" + body.format(log=calls_log, shot=screenshot))
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+def count_calls(calls_log: Path) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    if not calls_log.exists():
+        return counts
+    for line in calls_log.read_text().splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        key = " ".join(parts[:2]) if parts[0] == "am" and len(parts) > 1 else parts[0]
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+async def start_site(app: web.Application) -> Tuple[web.AppRunner, int]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+
+async def run_scenario(args: argparse.Namespace, instance_count: int, work_dir: Path) -> Dict:
+    api = FakeRobloxApi(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429,
+                        args.offline_rate, args.wrong_place_rate)
+    api_app = web.Application()
+    api_app.router.add_post('/v1/presence/users', api.handle_presence)
+    api_app.router.add_get('/v1/users/authenticated', api.handle_authenticated)
+    api_runner, api_port = await start_site(api_app)
+
+    sink = FakeDiscordSink()
+    sink_app = web.Application()
+    sink_app.router.add_post('/api/webhooks/{tail:.*}', sink.handle)
+    sink_runner, sink_port = await start_site(sink_app)
+
+    scenario_dir = work_dir / f"n{instance_count}"
+    shim_dir = scenario_dir / "bin"
+    shim_dir.mkdir(parents=True)
+    calls_log = scenario_dir / "calls.log"
+    install_shims(shim_dir, calls_log)
+    os.environ['PATH'] = f"{shim_dir}{os.pathsep}{os.environ['PATH']}"
+
+    # Settings/webhook config của bench nằm trong thư mục tạm, không đụng file thật cạnh tool
+    api_url = f"http://127.0.0.1:{api_port}"
+    settings = {
+        'presenceEndpoints': [api_url],
+        'usersEndpoints': [api_url],
+        'renderer': args.renderer,
+        'eventLogPath': str(scenario_dir / "events.jsonl"),
+        'metricsPort': None,
+        'aggregatorUrl': None,
+        'crashProbeEnabled': True,
+        'apiRatePerSec': args.api_rate,
+        'apiBurst': args.api_burst,
+    }
+    rw.SETTINGS_PATH = scenario_dir / "tool_settings.json"
+    rw.SETTINGS_PATH.write_text(json.dumps(settings))
+    rw.WEBHOOK_CONFIG_PATH = scenario_dir / "webhook_config.json"
+    rw.WEBHOOK_CONFIG_PATH.write_text(json.dumps({
+        'webhook_url': f"http://127.0.0.1:{sink_port}/api/webhooks/sim/token",
+        'device_name': "fleet-sim",
+        'interval': 1,
+        'mode': args.webhook_mode,
+        'enabled': True,
+    }))
+
+    tool = rw.MultiRejoinTool()
+    tool.webhook_manager.outbox = rw.WebhookOutbox(scenario_dir / "webhook_outbox.json")
+    tool.config_path = scenario_dir / "multi_configs.json"
+    rw.event_log.configure(tool.settings)
+
+    for index in range(instance_count):
+        package_name = f"com.roblox.sim{index}"
+        config = rw.InstanceConfig(package_name, f"sim_user_{index}", 10_000 + index, PLACE_ID,
+                                   game_name="Sim 🧪", delay_sec=args.delay_sec)
+        tool.instances.append(tool.create_instance(package_name, config, f".ROBLOSECURITY=_sim_{10_000 + index}"))
+
+    # Đo độ trễ lịch: lúc instance được lấy ra khỏi heap so với deadline của nó
+    # (loop gom cả instance sắp tới hạn vào batch nên lấy sớm thì tính là 0)
+    lags: List[float] = []
+    deadlines: Dict[int, float] = {}
+    checks = {'count': 0}
+    original_schedule = tool.scheduler.schedule
+    original_pop_due = tool.scheduler.pop_due
+    original_process_check = tool.process_check
+
+    def schedule(instance, delay_sec: float, jitter: bool = True):
+        original_schedule(instance, delay_sec, jitter)
+        deadlines[id(instance)] = instance.next_check_at
+
+    def pop_due(now: float):
+        due = original_pop_due(now)
+        popped_at = time.monotonic()
+        for instance in due:
+            lags.append(max(0.0, popped_at - deadlines.get(id(instance), popped_at)))
+        return due
+
+    async def process_check(instance, presence):
+        await original_process_check(instance, presence)
+        checks['count'] += 1
+
+    tool.scheduler.schedule = schedule
+    tool.scheduler.pop_due = pop_due
+    tool.process_check = process_check
+
+    process = psutil.Process()
+    process.cpu_percent(None)
+    cpu_before = process.cpu_times()
+    rss_peak = process.memory_info().rss
+    started = time.monotonic()
+
+    tool.is_running = True
+    loop_task = asyncio.create_task(tool.run_multi_instance_loop())
+    while time.monotonic() - started < args.duration:
+        await asyncio.sleep(1)
+        rss_peak = max(rss_peak, process.memory_info().rss)
+    tool.stop_monitoring()
+    await loop_task
+
+    elapsed = time.monotonic() - started
+    cpu_after = process.cpu_times()
+    cpu_sec = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    calls = count_calls(calls_log)
+    relaunches = sum(count for (_, reason), count in rw.tool_metrics.relaunches.items())
+
+    await tool.http.close()
+    await api_runner.cleanup()
+    await sink_runner.cleanup()
+    rw.tool_metrics.relaunches.clear()
+    rw.tool_metrics.request_latency.clear()
+    rw.tool_metrics.requests.clear()
+    os.environ['PATH'] = os.environ['PATH'].split(os.pathsep, 1)[1]
+
+    return {
+        'instances': instance_count,
+        'durationSec': round(elapsed, 1),
+        'checks': checks['count'],
+        'checksPerSec': round(checks['count'] / elapsed, 2),
+        'lagP50Ms': round(percentile(lags, 50) * 1000, 1),
+        'lagP95Ms': round(percentile(lags, 95) * 1000, 1),
+        'lagMaxMs': round(max(lags, default=0.0) * 1000, 1),
+        'relaunches': relaunches,
+        'amStart': calls.get("am start", 0),
+        'amForceStop': calls.get("am force-stop", 0),
+        'screencap': calls.get("screencap", 0),
+        'apiRequests': api.stats['requests'],
+        'api429': api.stats['throttled'],
+        'api5xx': api.stats['errors'],
+        'webhookMessages': sink.stats['messages'],
+        'cpuPercent': round(cpu_sec * 100 / elapsed, 1),
+        'rssPeakMb': round(rss_peak / (1024 ** 2), 1),
+        'loopLagMaxMs': round(rw.tool_metrics.loop_lag_max_sec * 1000, 1),
+    }
+
+
+def render(results: List[Dict]):
+    # Mỗi kịch bản một cột để bảng vẫn vừa terminal 80 cột của Termux
+    table = Table(title="🧪 Fleet simulation", show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    table.add_column("Chỉ số", style="bold")
+    for result in results:
+        table.add_column(f"{result['instances']} inst", justify="right", no_wrap=True)
+    rows = [
+        ("Checks", 'checks'), ("Checks/s", 'checksPerSec'),
+        ("Lag lịch p50 (ms)", 'lagP50Ms'), ("Lag lịch p95 (ms)", 'lagP95Ms'), ("Lag lịch max (ms)", 'lagMaxMs'),
+        ("Relaunch", 'relaunches'), ("am start", 'amStart'), ("am force-stop", 'amForceStop'),
+        ("screencap", 'screencap'), ("API request", 'apiRequests'), ("API 429", 'api429'),
+        ("API 5xx", 'api5xx'), ("Webhook message", 'webhookMessages'), ("CPU tool (%)", 'cpuPercent'),
+        ("RSS peak (MB)", 'rssPeakMb'), ("Loop lag max (ms)", 'loopLagMaxMs'),
+    ]
+    for title, key in rows:
+        table.add_row(title, *(str(result[key]) for result in results))
+    rw.console.print(table)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark vòng monitor với fake Roblox API và fake device")
+    parser.add_argument("--instances", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--duration", type=float, default=30, help="Số giây chạy mỗi kịch bản")
+    parser.add_argument("--delay-sec", type=int, default=10, help="delaySec của mỗi instance")
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Tỉ lệ request presence trả 500")
+    parser.add_argument("--rate-429", type=float, default=0.02, help="Tỉ lệ request presence trả 429")
+    parser.add_argument("--offline-rate", type=float, default=0.01, help="Tỉ lệ user offline mỗi lần check")
+    parser.add_argument("--wrong-place-rate", type=float, default=0.01, help="Tỉ lệ user sai map mỗi lần check")
+    parser.add_argument("--api-rate", type=float, default=50, help="apiRatePerSec cho bench")
+    parser.add_argument("--api-burst", type=int, default=100, help="apiBurst cho bench")
+    parser.add_argument("--webhook-mode", choices=["change", "periodic"], default="change")
+    parser.add_argument("--renderer", choices=["live", "plain"], default="live")
+    parser.add_argument("--json", default=None, help="Ghi kết quả ra file JSON")
+    return parser.parse_args(argv)
+
+
+async def main():
+    args = parse_args()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="fleet-sim-") as temp_dir:
+        for instance_count in args.instances:
+            # Dashboard của tool ghi thẳng ra terminal, chuyển sang devnull trong lúc đo
+            sys.stdout.flush()
+            saved_stdout = os.dup(1)
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, 1)
+            try:
+                result = await run_scenario(args, instance_count, Path(temp_dir))
+            finally:
+                sys.stdout.flush()
+                os.dup2(saved_stdout, 1)
+                os.close(saved_stdout)
+                os.close(devnull)
+            results.append(result)
+            print(f"✅ {instance_count} instances: {result['checksPerSec']} checks/s, "
+                  f"lag p95 {result['lagP95Ms']}ms, {result['relaunches']} relaunch")
+
+    render(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Đã ghi kết quả vào {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
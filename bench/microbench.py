@@ -0,0 +1,291 @@
+"""
+Microbenchmark các hàm chạy mỗi tick/mỗi lần render của rejoin_webhook.py, so với baseline đã lưu.
+
+Mỗi case chạy với fleet nhỏ và fleet lớn, lấy median (µs/lần gọi) của nhiều lượt đo.
+Case nào chậm hơn baseline quá --threshold và quá --min-delta-us thì bị đánh dấu; nếu baseline
+đo trên cùng cấu hình máy thì script thoát với mã 1, khác máy thì chỉ cảnh báo.
+
+Ví dụ:
+    python bench/microbench.py                      # so với bench/microbench_baseline.json
+    python bench/microbench.py --save-baseline      # ghi lại baseline trên máy hiện tại
+    python bench/microbench.py --only render --sizes 10 500
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rich.table import Table
+from rich import box
+
+import rejoin_webhook as rw
+
+BASELINE_PATH = Path(__file__).parent / "microbench_baseline.json"
+PLACE_ID = "2753915549"
+
+ANDROID_PACKAGES = [
+    "android", "com.android.systemui", "com.android.settings", "com.android.phone", "com.android.vending",
+    "com.android.chrome", "com.android.providers.media", "com.android.providers.downloads",
+    "com.android.inputmethod.latin", "com.android.launcher3", "com.android.bluetooth", "com.android.nfc",
+    "com.google.android.gms", "com.google.android.gsf", "com.google.android.youtube",
+    "com.google.android.webview", "com.google.android.apps.photos", "com.termux", "com.termux.boot",
+    "com.termux.api", "com.facebook.katana", "com.zing.zalo", "com.discord", "com.whatsapp",
+    "com.samsung.android.app.spage", "com.mi.android.globalFileexplorer", "com.miui.securitycenter",
+    "com.tencent.ig", "com.garena.game.kgvn", "com.vng.pubgmobile",
+]
+
+
+def package_names(count: int) -> List[str]:
+    names = ["com.roblox.client", "com.roblox.client.vnggames", *rw.ARYA_PACKAGES]
+    index = 0
+    while len(names) < count:
+        names.append(f"com.roblox.clien{chr(ord('a') + index % 26)}{index // 26 or ''}")
+        index += 1
+    return names[:count]
+
+
+def installed_packages(roblox_count: int) -> List[str]:
+    # Máy farm thường: vài trăm package hệ thống/app thường lẫn với các clone Roblox
+    names = list(ANDROID_PACKAGES)
+    names.extend(f"com.android.vendor.service{index}" for index in range(250))
+    names.extend(f"com.example.app{index}.release" for index in range(60))
+    names.extend(package_names(roblox_count))
+    random.Random(roblox_count).shuffle(names)
+    return names
+
+
+def build_configs(count: int) -> Dict[str, Dict]:
+    return {
+        package_name: {
+            'username': f"farm_account_{index:03d}",
+            'userId': 1_000_000 + index,
+            'placeId': PLACE_ID,
+            'gameName': "Blox Fruits 🍎",
+            'linkCode': None,
+            'delaySec': 30,
+            'packageName': package_name,
+        }
+        for index, package_name in enumerate(package_names(count))
+    }
+
+
+def build_instances(configs: Dict[str, Dict], settings: Dict) -> List['rw.InstanceState']:
+    statuses = [("Online ✅", "đúng game 🎮"), ("Offline 💤", "User offline! Tiến hành rejoin! 🚀"),
+                ("Sai map rồi 🗺️", "User đang trong game nhưng sai rootPlaceId (123). Đã rejoin đúng map! 🎯")]
+    instances = []
+    for index, (package_name, data) in enumerate(configs.items()):
+        config = rw.InstanceConfig.from_dict(package_name, data)
+        user = rw.RobloxUser(config.username, config.user_id, f"_cookie_{index}")
+        instance = rw.InstanceState(package_name, user, config, rw.PollPolicy.from_config(config, settings))
+        instance.status, instance.info = statuses[index % len(statuses)]
+        instance.countdown_seconds = index % 90
+        instances.append(instance)
+    return instances
+
+
+def build_presences(count: int) -> List[Optional[Dict]]:
+    # Phần lớn online đúng map, còn lại rải đủ các nhánh của analyze_presence
+    kinds = [
+        {'userPresenceType': 2, 'rootPlaceId': int(PLACE_ID)},
+        {'userPresenceType': 2, 'rootPlaceId': int(PLACE_ID)},
+        {'userPresenceType': 2, 'rootPlaceId': int(PLACE_ID)},
+        {'userPresenceType': 0, 'rootPlaceId': None},
+        {'userPresenceType': 2, 'rootPlaceId': 4442272183},
+        {'userPresenceType': 3, 'rootPlaceId': None},
+        {'throttled': True},
+        None,
+    ]
+    return [kinds[index % len(kinds)] for index in range(count)]
+
+
+def build_cases(size: int, settings: Dict) -> List[Tuple[str, Callable[[], object]]]:
+    configs = build_configs(size)
+    instances = build_instances(configs, settings)
+    presences = build_presences(size)
+    handlers = [rw.StatusHandler() for _ in range(size)]
+    names = package_names(size)
+    installed = installed_packages(size)
+    matcher = rw.package_index.matcher
+
+    def analyze_presence():
+        for handler, presence in zip(handlers, presences):
+            handler.analyze_presence(presence, PLACE_ID)
+
+    def package_display():
+        for name in names:
+            rw.UIRenderer.package_display(name)
+
+    def package_index_display_name():
+        for name in names:
+            rw.PackageIndex.display_name(name)
+
+    def keyword_match():
+        return [name for name in installed if matcher.search(name.lower())]
+
+    def live_rows():
+        for instance in instances:
+            rw.UIRenderer.build_instance_row(instance, "12:00:00")
+
+    return [
+        ("analyze_presence", analyze_presence),
+        ("render_multi_instance_table", lambda: rw.UIRenderer.render_multi_instance_table(instances, 0)),
+        ("display_configured_packages", lambda: rw.UIRenderer.display_configured_packages(configs)),
+        ("build_instance_row", live_rows),
+        ("package_display", package_display),
+        ("PackageIndex.display_name", package_index_display_name),
+        ("keyword_match", keyword_match),
+    ]
+
+
+def fixed_cases() -> List[Tuple[str, Callable[[], object]]]:
+    # Không phụ thuộc số instance: title cache và lần dựng figlet đầu tiên
+    return [
+        ("render_title", rw.UIRenderer.render_title),
+        ("render_title.cold", rw.UIRenderer._build_title),
+    ]
+
+
+def measure(func: Callable[[], object], min_time_sec: float, repeat: int) -> float:
+    """Trả về µs/lần gọi (median của `repeat` lượt), mỗi lượt chạy đủ lâu để timer ổn định."""
+    func()
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time_sec / 5 or loops >= 1_000_000:
+            break
+        loops *= 2
+
+    # Median ít bị một lượt may mắn/xui (GC, máy bận) kéo lệch hơn là lấy lượt nhanh nhất
+    timings = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - started) / loops)
+    return statistics.median(timings) * 1_000_000
+
+
+def machine_info() -> Dict:
+    return {
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'cpuCount': os.cpu_count(),
+    }
+
+
+def load_baseline(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(path: Path, results: Dict[str, float]):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'machine': machine_info(), 'results': results}, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def render(results: Dict[str, float], baseline: Optional[Dict], threshold: float,
+           min_delta_us: float) -> List[str]:
+    table = Table(title="⏱️ Microbenchmark", show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    table.add_column("Case", overflow="fold")
+    table.add_column("µs/lần", justify="right", no_wrap=True)
+    table.add_column("Baseline", justify="right", no_wrap=True)
+    table.add_column("Thay đổi", justify="right", no_wrap=True)
+
+    baseline_results = (baseline or {}).get('results', {})
+    regressions = []
+    for name, value in results.items():
+        old = baseline_results.get(name)
+        if not old:
+            table.add_row(name, f"{value:,.1f}", "-", "-")
+            continue
+        change = (value - old) / old
+        # Case chỉ vài µs thì lệch % lớn là nhiễu timer, phải chậm hơn cả về tuyệt đối mới tính
+        if change > threshold and value - old >= min_delta_us:
+            regressions.append(name)
+            change_text = f"[red bold]+{change:.0%} ⚠️[/red bold]"
+        elif change < -threshold:
+            change_text = f"[green]{change:.0%}[/green]"
+        else:
+            change_text = f"{change:+.0%}"
+        table.add_row(name, f"{value:,.1f}", f"{old:,.1f}", change_text)
+
+    rw.console.print(table)
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Microbenchmark các helper chạy mỗi tick/render")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 200], help="Số instance của fleet nhỏ/lớn")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Số giây tối thiểu đo mỗi case")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="Chậm hơn baseline quá tỉ lệ này thì coi là regression")
+    parser.add_argument("--min-delta-us", type=float, default=1.0,
+                        help="Chỉ coi là regression khi chậm hơn baseline ít nhất số µs này")
+    parser.add_argument("--only", default=None, help="Chỉ chạy case có tên chứa chuỗi này")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả lần này làm baseline mới")
+    args = parser.parse_args(argv)
+    if args.save_baseline and (args.only or args.sizes != parser.get_default("sizes")):
+        # Baseline luôn được ghi lại trọn bộ trên một máy, không trộn kết quả của các máy khác nhau
+        parser.error("--save-baseline ghi lại toàn bộ baseline, không dùng cùng --only/--sizes")
+    return args
+
+
+def main() -> int:
+    args = parse_args()
+    settings = dict(rw.DEFAULT_SETTINGS)
+    # Dòng CPU/RAM của bảng cần ít nhất một sample như lúc tool chạy thật
+    rw.metrics_sampler.samples.append(rw.MetricsSampler.read_sample())
+
+    cases: List[Tuple[str, Callable[[], object]]] = list(fixed_cases())
+    for size in args.sizes:
+        cases.extend((f"{name}[{size}]", func) for name, func in build_cases(size, settings))
+    if args.only:
+        cases = [(name, func) for name, func in cases if args.only in name]
+
+    results: Dict[str, float] = {}
+    for name, func in cases:
+        # Các hàm render in qua console.capture, không ra terminal
+        results[name] = round(measure(func, args.min_time, args.repeat), 2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        render(results, None, args.threshold, args.min_delta_us)
+        print(f"💾 Đã lưu baseline vào {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    gate = True
+    if baseline is None:
+        print(f"⚠️ Chưa có baseline ({args.baseline}), chạy với --save-baseline để tạo")
+    elif baseline.get('machine') != machine_info():
+        gate = False
+        print(f"⚠️ Baseline đo trên máy khác ({baseline.get('machine')}), chỉ cảnh báo chứ không fail")
+
+    regressions = render(results, baseline, args.threshold, args.min_delta_us)
+    if regressions:
+        print(f"{'❌' if gate else '⚠️'} {len(regressions)} case chậm hơn baseline quá {args.threshold:.0%} "
+              f"và {args.min_delta_us:g}µs: {', '.join(regressions)}")
+        return 1 if gate else 0
+    print("✅ Không có regression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
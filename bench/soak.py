@@ -0,0 +1,169 @@
+"""
+Soak test cho vòng menu ↔ monitor của rejoin_webhook.py: chạy lặp N vòng với dữ liệu giả và
+kiểm tra bộ nhớ/task/InstanceState có tăng theo số vòng không.
+
+Menu, cookie và presence đều được thay từ bên ngoài (không cần thiết bị, mạng hay root).
+
+Ví dụ:
+    python bench/soak.py --cycles 30 --instances 20
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psutil
+from rich.table import Table
+from rich import box
+
+import rejoin_webhook as rw
+
+
+class SoakHarness:
+    """Chạy lặp menu → monitor → menu với dữ liệu giả, đo xem bộ nhớ/task/instance có tăng theo số vòng không."""
+
+    WARMUP_CYCLES = 3
+
+    def __init__(self, cycles: int, instance_count: int, monitor_sec: float, max_growth_kb: float):
+        self.cycles = max(self.WARMUP_CYCLES + 1, cycles)
+        self.instance_count = instance_count
+        self.monitor_sec = monitor_sec
+        self.max_growth_kb = max_growth_kb
+        self.samples: List[Dict] = []
+        self.completed = 0
+
+    def build_configs(self) -> Dict:
+        return {
+            f"com.roblox.soak{index}": {
+                'username': f"soak_user_{index}",
+                'userId': 1000 + index,
+                'placeId': "2753915549",
+                'gameName': "Soak 🧪",
+                'linkCode': None,
+                'delaySec': 5,
+                'packageName': f"com.roblox.soak{index}",
+            }
+            for index in range(self.instance_count)
+        }
+
+    def sample(self):
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        self.samples.append({
+            'cycle': self.completed,
+            'tracedKb': current / 1024,
+            'rssMb': psutil.Process().memory_info().rss / (1024 ** 2),
+            'tasks': len(asyncio.all_tasks()),
+            'liveInstances': sum(1 for obj in gc.get_objects() if isinstance(obj, rw.InstanceState)),
+        })
+
+    def scripted_ask(self, tool: 'rw.MultiRejoinTool'):
+        def ask(prompt: str) -> str:
+            if prompt.strip().startswith("Chọn option"):
+                # Mỗi lần về tới menu là xong một vòng
+                self.sample()
+                if self.completed >= self.cycles:
+                    return "0"
+                self.completed += 1
+                return "1"
+            # Chọn "chạy tất cả" rồi hẹn giờ dừng monitor như khi người dùng bấm Ctrl+C
+            asyncio.get_running_loop().call_later(self.monitor_sec, tool.stop_monitoring)
+            return "0"
+        return ask
+
+    async def run(self) -> bool:
+        tracemalloc.start()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = Path(temp_dir) / "multi_configs.json"
+            with open(config_path, 'w', encoding='utf-8') as f:
+                json.dump(self.build_configs(), f)
+
+            tool = rw.MultiRejoinTool()
+            # Không đụng tới thiết bị/mạng thật: cookie, presence, webhook, aggregator đều giả hoặc tắt
+            tool.settings.update(startDelaySec=0, httpWarmUp=False, crashProbeEnabled=False,
+                                 metricsPort=None, configReloadSec=0.5)
+            tool.config_path = config_path
+            tool.live_dashboard = None
+            tool.aggregator_client = None
+            tool.webhook_manager.enabled = False
+            rw.event_log.enabled = False
+
+            async def read_cookie(package_name: str) -> Optional[str]:
+                return f".ROBLOSECURITY=_soak_{package_name}"
+
+            async def fetch_presences(users: List['rw.RobloxUser'], semaphore=None) -> Dict[int, Optional[Dict]]:
+                return {user.user_id: {'userId': user.user_id, 'userPresenceType': 2, 'rootPlaceId': 2753915549}
+                        for user in users}
+
+            # Menu hỏi qua Utils.ask, cookie đọc qua Utils.get_roblox_cookie: thay tạm cả hai từ bên ngoài tool
+            original_ask = rw.Utils.ask
+            original_read_cookie = rw.Utils.get_roblox_cookie
+            rw.Utils.ask = self.scripted_ask(tool)
+            rw.Utils.get_roblox_cookie = read_cookie
+            tool.presence_batcher.fetch = fetch_presences
+
+            # Màn hình menu/dashboard (kể cả lệnh clear) ghi thẳng vào fd 1, chuyển hết sang devnull
+            sys.stdout.flush()
+            saved_stdout = os.dup(1)
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, 1)
+            try:
+                await tool.run_menu_loop()
+            finally:
+                sys.stdout.flush()
+                os.dup2(saved_stdout, 1)
+                os.close(saved_stdout)
+                os.close(devnull)
+                rw.Utils.ask = original_ask
+                rw.Utils.get_roblox_cookie = original_read_cookie
+                await tool.http.close()
+        tracemalloc.stop()
+        return self.report()
+
+    def report(self) -> bool:
+        table = Table(title="🧪 Soak menu ↔ monitor", show_header=True, header_style="bold cyan", box=box.ROUNDED)
+        for column in ("Vòng", "Traced KB", "RSS MB", "Tasks", "Instances sống"):
+            table.add_column(column, justify="right")
+        step = max(1, len(self.samples) // 10)
+        for sample in self.samples[::step] + ([self.samples[-1]] if (len(self.samples) - 1) % step else []):
+            table.add_row(str(sample['cycle']), f"{sample['tracedKb']:.0f}", f"{sample['rssMb']:.1f}",
+                          str(sample['tasks']), str(sample['liveInstances']))
+        rw.console.print(table)
+
+        baseline = self.samples[self.WARMUP_CYCLES]
+        final = self.samples[-1]
+        growth_kb = final['tracedKb'] - baseline['tracedKb']
+        ok = (growth_kb <= self.max_growth_kb and final['tasks'] <= baseline['tasks']
+              and final['liveInstances'] == 0)
+        print(f"{'✅' if ok else '❌'} {self.completed} vòng, bộ nhớ tăng {growth_kb:.0f}KB sau warm-up "
+              f"(giới hạn {self.max_growth_kb:.0f}KB), tasks {baseline['tasks']} → {final['tasks']}, "
+              f"instance còn sống ở menu: {final['liveInstances']}")
+        return ok
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Chạy lặp menu ↔ monitor với dữ liệu giả để kiểm tra rò rỉ bộ nhớ")
+    parser.add_argument("--cycles", type=int, default=30)
+    parser.add_argument("--instances", type=int, default=20)
+    parser.add_argument("--monitor-sec", type=float, default=1.5, help="Thời gian monitor mỗi vòng")
+    parser.add_argument("--max-growth-kb", type=float, default=256,
+                        help="Bộ nhớ (tracemalloc) được phép tăng sau warm-up")
+    return parser.parse_args(argv)
+
+
+async def main() -> int:
+    args = parse_args()
+    harness = SoakHarness(args.cycles, args.instances, args.monitor_sec, args.max_growth_kb)
+    return 0 if await harness.run() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -3,6 +3,7 @@ import subprocess
 import asyncio
 import aiohttp
 import json
+import io
 import os
 import sys
 import time
@@ -12,11 +13,22 @@ from typing import Dict, Optional, List, Tuple
 import platform
 import psutil
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import shutil
 import random
+import heapq
+import contextlib
+from collections import deque
 import requests
 import traceback
 import threading
+import socket
+import argparse
+import signal
+import shlex
+import sqlite3
+import hashlib
+import hmac
 
 def ensure_packages():
     required_packages = ["aiohttp", "psutil", "rich", "pyfiglet"]
@@ -38,12 +50,102 @@ from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.layout import Layout
+from rich.live import Live
+from rich.console import Group
+from rich.text import Text
 from rich import box
 import pyfiglet
+from aiohttp import web
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 console = Console()
 CONFIG_PATH = Path(__file__).parent / "multi_configs.json"
 WEBHOOK_CONFIG_PATH = Path(__file__).parent / "webhook_config.json"
+SETTINGS_PATH = Path(__file__).parent / "tool_settings.json"
+WEBHOOK_OUTBOX_PATH = Path(__file__).parent / "webhook_outbox.json"
+AGGREGATOR_OUTBOX_PATH = Path(__file__).parent / "aggregator_outbox.json"
+EVENT_LOG_PATH = Path(__file__).parent / "events.jsonl"
+PACKAGE_INDEX_PATH = Path(__file__).parent / "package_index.json"
+try:
+    # Mốc khởi động tính từ lúc process được tạo, không phải lúc import xong thư viện
+    PROCESS_STARTED_AT = psutil.Process().create_time()
+except Exception:
+    PROCESS_STARTED_AT = time.time()
+WEBHOOK_ICON_URL = "https://cdn.discordapp.com/attachments/1269331861902196902/1422144505485721653/1.png?ex=68db9ac8&is=68da4948&hm=a7ed4d0a5740ff876e12b22f94f3e14df81d5396fb504b52251f1382e65d1211&"
+# Giới hạn của Discord cho một message webhook
+FIELD_VALUE_LIMIT = 1000
+EMBED_FIELD_LIMIT = 25
+MESSAGE_EMBED_LIMIT = 10
+MESSAGE_CHAR_LIMIT = 5500
+# Cấu hình chung của tool, ghi đè bằng tool_settings.json
+DEFAULT_SETTINGS = {
+    "presenceBatchSize": 50,
+    "httpTimeoutSec": 10,
+    "httpConnectTimeoutSec": 5,
+    "httpPoolSize": 20,
+    "httpLimitPerHost": 4,
+    "httpKeepAliveSec": 60,
+    "httpDnsCacheSec": 300,
+    "httpWarmUp": True,
+    "maxConcurrentChecks": 8,
+    "checkJitterSec": 3,
+    "checkBatchWindowSec": 1,
+    "renderIntervalSec": 5,
+    "webhookInitialDelaySec": 30,
+    "webhookRetrySec": 60,
+    "webhookTimeoutSec": 15,
+    "webhookMaxBackoffSec": 1800,
+    "aggregatorUrl": None,
+    "aggregatorDeviceName": None,
+    "aggregatorSnapshotSec": 15,
+    "aggregatorPushSec": 30,
+    "aggregatorTimeoutSec": 5,
+    "aggregatorToken": None,
+    "screenshotMaxSide": 960,
+    "screenshotFormat": "jpeg",
+    "screenshotQuality": 60,
+    "screenshotTimeoutSec": 10,
+    "maxConcurrentCommands": 4,
+    "commandTimeoutSec": 15,
+    "maxConcurrentLaunches": 2,
+    "launchMinFreeMemoryPercent": 15,
+    "launchMaxCpuPercent": 85,
+    "launchMaxWaitSec": 180,
+    "launchPollSec": 1,
+    "renderer": "live",
+    "liveRenderIntervalSec": 1,
+    "liveMaxRefreshPerSecond": 2,
+    "livePageSec": 5,
+    "metricsSampleSec": 2,
+    "metricsHistory": 60,
+    "metricsPort": None,
+    "metricsHost": "127.0.0.1",
+    "loopLagSampleSec": 1,
+    "eventLogEnabled": True,
+    "eventLogPath": None,
+    "eventLogMaxBytes": 5 * 1024 * 1024,
+    "eventLogBackups": 5,
+    "eventLogFlushSec": 5,
+    "eventLogBufferSize": 200,
+    "crashProbeEnabled": True,
+    "crashProbeSec": 3,
+    "configReloadSec": 2,
+    "startDelaySec": 3,
+    "adaptivePolling": True,
+    "pollBackoffFactor": 1.5,
+    "pollMaxSec": 300,
+    "apiRatePerSec": 5,
+    "apiBurst": 10,
+    "rateLimitMaxWaitSec": 5,
+    "presenceEndpoints": ["https://presence.roproxy.com", "https://presence.roblox.com"],
+    "usersEndpoints": ["https://users.roblox.com", "https://users.roproxy.com"],
+    "circuitFailureThreshold": 3,
+    "circuitCooldownSec": 60,
+}
 def wait_back_menu():
     prompt_text = ("\nPress Enter to back to menu...", [220, 228, 229])
     input(prompt_text)
@@ -56,6 +158,90 @@ ARYA_PACKAGES = [
     "com.arya.clienz"
 ]
 
+class CommandResult:
+    def __init__(self, args: List[str], returncode: int, stdout: bytes = b"", stderr: bytes = b"",
+                 timed_out: bool = False, duration: float = 0.0):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    @property
+    def text(self) -> str:
+        return self.stdout.decode('utf-8', errors='ignore')
+
+    @property
+    def error(self) -> str:
+        if self.timed_out:
+            return f"timeout sau {self.duration:.1f}s"
+        return self.stderr.decode('utf-8', errors='ignore').strip() or f"exit code {self.returncode}"
+
+class CommandRunner:
+    """Chạy lệnh thiết bị (am/pm/settings/screencap) không qua shell, có timeout và giới hạn song song."""
+
+    def __init__(self, max_concurrent: int = 4, default_timeout: float = 15):
+        self.configure(max_concurrent, default_timeout)
+
+    def configure(self, max_concurrent: int, default_timeout: float):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.default_timeout = default_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._thread_semaphore = threading.BoundedSemaphore(self.max_concurrent)
+
+    async def run(self, args: List[str], timeout: Optional[float] = None) -> CommandResult:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        timeout = timeout or self.default_timeout
+
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                return CommandResult(args, 127, stderr=str(e).encode(), duration=time.monotonic() - started)
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                timed_out = False
+            except asyncio.TimeoutError:
+                process.kill()
+                stdout, stderr = await process.communicate()
+                timed_out = True
+
+            return CommandResult(args, process.returncode, stdout, stderr, timed_out,
+                                 time.monotonic() - started)
+
+    def run_blocking(self, args: List[str], timeout: Optional[float] = None) -> CommandResult:
+        # Dùng cho menu đồng bộ và thread Android ID, nơi không có event loop
+        timeout = timeout or self.default_timeout
+
+        with self._thread_semaphore:
+            started = time.monotonic()
+            try:
+                result = subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True,
+                                        timeout=timeout, check=False)
+            except subprocess.TimeoutExpired as e:
+                return CommandResult(args, -9, e.stdout or b"", e.stderr or b"", True,
+                                     time.monotonic() - started)
+            except OSError as e:
+                return CommandResult(args, 127, stderr=str(e).encode(), duration=time.monotonic() - started)
+
+            return CommandResult(args, result.returncode, result.stdout, result.stderr, False,
+                                 time.monotonic() - started)
+
+command_runner = CommandRunner(DEFAULT_SETTINGS['maxConcurrentCommands'], DEFAULT_SETTINGS['commandTimeoutSec'])
+
 class AndroidIDManager:
     def __init__(self):
         self.auto_android_id_enabled = False
@@ -64,12 +250,12 @@ class AndroidIDManager:
 
     def set_android_id(self, android_id):
         try:
-            subprocess.run(["settings", "put", "secure", "android_id", android_id], check=True)
+            result = command_runner.run_blocking(["settings", "put", "secure", "android_id", android_id])
+            if not result.ok:
+                print(f"\033[1;31m[ Tool ] - Failed to set Android ID: {result.error}\033[0m")
+                return False
             print(f"\033[1;32m[ Tool ] - Android ID set to: {android_id}\033[0m")
             return True
-        except subprocess.CalledProcessError as e:
-            print(f"\033[1;31m[ Tool ] - Failed to set Android ID: {e}\033[0m")
-            return False
         except Exception as e:
             print(f"\033[1;31m[ Tool ] - Error setting Android ID: {e}\033[0m")
             return False
@@ -136,18 +322,13 @@ class AndroidIDManager:
 
     def get_current_android_id(self):
         try:
-            result = subprocess.run(
-                ["settings", "get", "secure", "android_id"], 
-                capture_output=True, 
-                text=True, 
-                check=True
-            )
-            current_id = result.stdout.strip()
+            result = command_runner.run_blocking(["settings", "get", "secure", "android_id"])
+            if not result.ok:
+                print(f"\033[1;31m[ Tool ] - Failed to get current Android ID: {result.error}\033[0m")
+                return None
+            current_id = result.text.strip()
             print(f"\033[1;36m[ Tool ] - Current Android ID: {current_id}\033[0m")
             return current_id
-        except subprocess.CalledProcessError as e:
-            print(f"\033[1;31m[ Tool ] - Failed to get current Android ID: {e}\033[0m")
-            return None
         except Exception as e:
             print(f"\033[1;31m[ Tool ] - Error getting Android ID: {e}\033[0m")
             return None
@@ -196,13 +377,607 @@ class AndroidIDManager:
             
             input("\nPress Enter to continue...")
 
-class WebhookManager:
+class MetricsSampler:
+    """Thread nền đọc CPU/RAM/disk/uptime/load theo chu kỳ vào ring buffer, không ai phải sample trên event loop."""
+
+    def __init__(self, interval_sec: float = 2, history: int = 60):
+        self.interval_sec = interval_sec
+        self.samples = deque(maxlen=max(1, int(history)))
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.process = psutil.Process()
+
+    def configure(self, interval_sec: float, history: int):
+        with self._lock:
+            self.interval_sec = interval_sec
+            self.samples = deque(self.samples, maxlen=max(1, int(history)))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        # Lần gọi đầu của cpu_percent(None) luôn trả 0, chỉ dùng để mốc thời gian
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+        while not self._stop_event.wait(self.interval_sec):
+            try:
+                sample = self.read_sample()
+                sample['processCpuPercent'] = self.process.cpu_percent(interval=None)
+                sample['processRss'] = self.process.memory_info().rss
+            except Exception:
+                continue
+            with self._lock:
+                self.samples.append(sample)
+
+    @staticmethod
+    def read_sample() -> Dict:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        try:
+            with open('/proc/uptime', 'r') as f:
+                uptime_seconds = float(f.readline().split()[0])
+        except Exception:
+            uptime_seconds = time.time() - psutil.boot_time()
+        try:
+            load_avg = os.getloadavg()
+        except (AttributeError, OSError):
+            load_avg = (0.0, 0.0, 0.0)
+
+        return {
+            'time': time.time(),
+            'cpuPercent': psutil.cpu_percent(interval=None),
+            'memoryTotal': memory.total,
+            'memoryAvailable': memory.available,
+            'memoryUsed': memory.used,
+            'memoryPercent': memory.percent,
+            'diskTotal': disk.total,
+            'diskUsed': disk.used,
+            'diskPercent': disk.percent,
+            'uptimeSec': uptime_seconds,
+            'loadAvg': load_avg,
+        }
+
+    def latest(self) -> Optional[Dict]:
+        with self._lock:
+            return self.samples[-1] if self.samples else None
+
+    def average(self, key: str, window_sec: float) -> Optional[float]:
+        cutoff = time.time() - window_sec
+        with self._lock:
+            values = [sample[key] for sample in self.samples if sample['time'] >= cutoff]
+        if not values:
+            return None
+        return sum(values) / len(values)
+
+metrics_sampler = MetricsSampler(DEFAULT_SETTINGS['metricsSampleSec'], DEFAULT_SETTINGS['metricsHistory'])
+
+class ToolMetrics:
+    """Counter/histogram trong bộ nhớ, export dạng Prometheus text; scrape chỉ đọc dict nên không chặn loop."""
+
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
     def __init__(self):
+        self.started_at = time.time()
+        self.request_latency: Dict[Tuple[str, str], Dict] = {}
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.relaunches: Dict[Tuple[str, str], int] = {}
+        self.local_throttles: Dict[str, int] = {}
+        self.last_success: Dict[str, float] = {}
+        self.loop_lag_sec = 0.0
+        self.loop_lag_max_sec = 0.0
+        self.get_instances = lambda: []
+        self._runner: Optional[web.AppRunner] = None
+
+    def observe_request(self, api: str, endpoint: str, outcome: str, elapsed_sec: float):
+        key = (api, endpoint)
+        histogram = self.request_latency.get(key)
+        if histogram is None:
+            histogram = {'buckets': [0] * len(self.LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+            self.request_latency[key] = histogram
+        for index, bound in enumerate(self.LATENCY_BUCKETS):
+            if elapsed_sec <= bound:
+                histogram['buckets'][index] += 1
+        histogram['count'] += 1
+        histogram['sum'] += elapsed_sec
+
+        request_key = (api, endpoint, outcome)
+        self.requests[request_key] = self.requests.get(request_key, 0) + 1
+
+    def record_local_throttle(self, api: str):
+        # Request bị token bucket chặn trước khi gửi, tách riêng để không lẫn với 429 thật từ Roblox
+        self.local_throttles[api] = self.local_throttles.get(api, 0) + 1
+
+    def record_relaunch(self, package_name: str, reason: str):
+        key = (package_name, reason)
+        self.relaunches[key] = self.relaunches.get(key, 0) + 1
+
+    def record_success(self, package_name: str):
+        self.last_success[package_name] = time.time()
+
+    async def monitor_loop_lag(self, interval_sec: float):
+        # Lag = thời gian ngủ thực tế trừ thời gian xin ngủ, loop bị chặn thì số này tăng
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval_sec)
+            lag = max(0.0, time.monotonic() - started - interval_sec)
+            self.loop_lag_sec = lag
+            self.loop_lag_max_sec = max(self.loop_lag_max_sec, lag)
+
+    @staticmethod
+    def _labels(**labels) -> str:
+        parts = []
+        for key, value in labels.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def render(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        metric("rejoin_request_latency_seconds", "histogram", "Latency of Roblox API requests per endpoint")
+        for (api, endpoint), histogram in sorted(self.request_latency.items()):
+            for bound, count in zip(self.LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f"rejoin_request_latency_seconds_bucket"
+                             f"{self._labels(api=api, endpoint=endpoint, le=bound)} {count}")
+            lines.append(f"rejoin_request_latency_seconds_bucket"
+                         f"{self._labels(api=api, endpoint=endpoint, le='+Inf')} {histogram['count']}")
+            lines.append(f"rejoin_request_latency_seconds_sum{self._labels(api=api, endpoint=endpoint)} "
+                         f"{histogram['sum']:.6f}")
+            lines.append(f"rejoin_request_latency_seconds_count{self._labels(api=api, endpoint=endpoint)} "
+                         f"{histogram['count']}")
+
+        metric("rejoin_requests_total", "counter", "Roblox API requests per endpoint and outcome")
+        for (api, endpoint, outcome), count in sorted(self.requests.items()):
+            lines.append(f"rejoin_requests_total{self._labels(api=api, endpoint=endpoint, outcome=outcome)} {count}")
+
+        metric("rejoin_local_throttled_total", "counter", "Requests held back by the local rate limiter, never sent")
+        for api, count in sorted(self.local_throttles.items()):
+            lines.append(f"rejoin_local_throttled_total{self._labels(api=api)} {count}")
+
+        metric("rejoin_relaunches_total", "counter", "Relaunches per package and reason")
+        for (package_name, reason), count in sorted(self.relaunches.items()):
+            lines.append(f"rejoin_relaunches_total{self._labels(package=package_name, reason=reason)} {count}")
+
+        now = time.time()
+        metric("rejoin_seconds_since_last_success", "gauge", "Seconds since the last successful presence check")
+        for instance in self.get_instances():
+            package_name = instance.package_name
+            last_success = self.last_success.get(package_name, self.started_at)
+            lines.append(f"rejoin_seconds_since_last_success{self._labels(package=package_name)} "
+                         f"{now - last_success:.1f}")
+
+        metric("rejoin_instance_online", "gauge", "1 when the instance is in the right game")
+        for instance in self.get_instances():
+            online = 1 if instance.status.startswith('Online') else 0
+            lines.append(f"rejoin_instance_online{self._labels(package=instance.package_name)} {online}")
+
+        metric("rejoin_event_loop_lag_seconds", "gauge", "Last measured event loop lag")
+        lines.append(f"rejoin_event_loop_lag_seconds {self.loop_lag_sec:.6f}")
+        metric("rejoin_event_loop_lag_max_seconds", "gauge", "Max event loop lag since start")
+        lines.append(f"rejoin_event_loop_lag_max_seconds {self.loop_lag_max_sec:.6f}")
+
+        sample = metrics_sampler.latest()
+        if sample is not None:
+            gauges = (
+                ("rejoin_process_resident_memory_bytes", 'processRss', "Resident memory of the tool"),
+                ("rejoin_process_cpu_percent", 'processCpuPercent', "CPU usage of the tool"),
+                ("rejoin_system_cpu_percent", 'cpuPercent', "System CPU usage"),
+                ("rejoin_system_memory_total_bytes", 'memoryTotal', "System memory total"),
+                ("rejoin_system_memory_available_bytes", 'memoryAvailable', "System memory available"),
+                ("rejoin_system_disk_used_bytes", 'diskUsed', "Disk used on /"),
+                ("rejoin_system_disk_total_bytes", 'diskTotal', "Disk total on /"),
+                ("rejoin_system_uptime_seconds", 'uptimeSec', "System uptime"),
+            )
+            for name, key, help_text in gauges:
+                if sample.get(key) is not None:
+                    metric(name, "gauge", help_text)
+                    lines.append(f"{name} {sample[key]}")
+            metric("rejoin_system_load1", "gauge", "1 minute load average")
+            lines.append(f"rejoin_system_load1 {sample['loadAvg'][0]}")
+
+        return "\n".join(lines) + "\n"
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8",
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start_server(self, host: str, port: int):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop_server(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+tool_metrics = ToolMetrics()
+
+class EventLog:
+    """Ghi event dạng JSONL: gom trong bộ nhớ, flush theo chu kỳ hoặc khi đầy buffer, xoay file theo dung lượng."""
+
+    def __init__(self, path: Path = EVENT_LOG_PATH, max_bytes: int = 5 * 1024 * 1024,
+                 backups: int = 5, buffer_size: int = 200):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer_size = buffer_size
+        self.enabled = True
+        self.buffer: List[str] = []
+        self.flush_event = asyncio.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, settings: Dict):
+        self.enabled = settings['eventLogEnabled']
+        self.path = Path(settings['eventLogPath']) if settings['eventLogPath'] else EVENT_LOG_PATH
+        self.max_bytes = settings['eventLogMaxBytes']
+        self.backups = settings['eventLogBackups']
+        self.buffer_size = settings['eventLogBufferSize']
+
+    def emit(self, event: str, **fields):
+        if not self.enabled:
+            return
+        record = {'ts': round(time.time(), 3), 'event': event}
+        record.update(fields)
+        self.buffer.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush_event.set()
+        # Ghi file chậm (thẻ nhớ kẹt) mà event vẫn dồn tới thì bỏ bớt event cũ, không để RAM phình ra
+        if len(self.buffer) > self.buffer_size * 10:
+            del self.buffer[:len(self.buffer) - self.buffer_size * 10]
+
+    def rotated_paths(self) -> List[Path]:
+        return [self.path.with_name(f"{self.path.name}.{index}") for index in range(1, self.backups + 1)]
+
+    def _rotate(self):
+        paths = self.rotated_paths()
+        if not paths:
+            self.path.unlink(missing_ok=True)
+            return
+        paths[-1].unlink(missing_ok=True)
+        for older, newer in zip(reversed(paths[1:]), reversed(paths[:-1])):
+            if newer.exists():
+                newer.replace(older)
+        self.path.replace(paths[0])
+
+    def write_lines(self, lines: List[str]):
+        with self._lock:
+            try:
+                if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError as e:
+                print(f"⚠️ Không ghi được event log: {e}")
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        lines, self.buffer = self.buffer, []
+        await asyncio.to_thread(self.write_lines, lines)
+
+    async def run_flusher(self, interval_sec: float):
+        try:
+            while True:
+                # Flush theo chu kỳ, hoặc sớm hơn khi emit báo buffer đã đủ buffer_size event
+                try:
+                    await asyncio.wait_for(self.flush_event.wait(), interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+                self.flush_event.clear()
+                await self.flush()
+        finally:
+            if self.buffer:
+                lines, self.buffer = self.buffer, []
+                self.write_lines(lines)
+
+event_log = EventLog()
+
+class EventLogAnalyzer:
+    """Đọc stream event log (kể cả file đã xoay) và tính availability cho từng account."""
+
+    def __init__(self, gap_cap_sec: float = 600, since: Optional[float] = None):
+        self.gap_cap_sec = gap_cap_sec
+        self.since = since
+        self.accounts: Dict[str, Dict] = {}
+
+    @staticmethod
+    def log_files(path: Path) -> List[Path]:
+        # File xoay có số lớn hơn là cũ hơn, đọc từ cũ tới mới để thời gian luôn tăng
+        rotated = []
+        for candidate in path.parent.glob(f"{path.name}.*"):
+            suffix = candidate.name[len(path.name) + 1:]
+            if suffix.isdigit():
+                rotated.append((int(suffix), candidate))
+        files = [candidate for _, candidate in sorted(rotated, reverse=True)]
+        if path.exists():
+            files.append(path)
+        return files
+
+    def account(self, record: Dict) -> Dict:
+        key = record.get('user') or record.get('package') or "unknown"
+        account = self.accounts.get(key)
+        if account is None:
+            account = {
+                'account': key, 'package': record.get('package'), 'firstTs': record['ts'], 'lastTs': None,
+                'observedSec': 0.0, 'onlineSec': 0.0, 'online': None, 'downSince': None,
+                'checks': 0, 'relaunches': 0, 'reasons': {}, 'rejoinSec': 0.0, 'rejoinCount': 0,
+            }
+            self.accounts[key] = account
+        return account
+
+    def feed(self, record: Dict):
+        if self.since is not None and record.get('ts', 0) < self.since:
+            return
+        event = record.get('event')
+        if event == 'launch':
+            account = self.account(record)
+            account['relaunches'] += 1
+            reason = record.get('reason', "unknown")
+            account['reasons'][reason] = account['reasons'].get(reason, 0) + 1
+            return
+        if event != 'check' or record.get('action') == 'throttled':
+            return
+
+        account = self.account(record)
+        ts = record['ts']
+        online = bool(record.get('online'))
+        if account['lastTs'] is not None:
+            # Khoảng trống quá dài (tool tắt) không được tính vào thời gian quan sát
+            gap = min(max(0.0, ts - account['lastTs']), self.gap_cap_sec)
+            account['observedSec'] += gap
+            if account['online']:
+                account['onlineSec'] += gap
+
+        if not online and account['downSince'] is None:
+            account['downSince'] = ts
+        elif online and account['downSince'] is not None:
+            account['rejoinSec'] += ts - account['downSince']
+            account['rejoinCount'] += 1
+            account['downSince'] = None
+
+        account['online'] = online
+        account['lastTs'] = ts
+        account['checks'] += 1
+
+    def feed_file(self, path: Path):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'ts' in record:
+                    self.feed(record)
+
+    def report(self) -> List[Dict]:
+        rows = []
+        for account in self.accounts.values():
+            hours = account['observedSec'] / 3600
+            rows.append({
+                'account': account['account'],
+                'package': account['package'],
+                'checks': account['checks'],
+                'observedHours': round(hours, 2),
+                'uptimePercent': round(account['onlineSec'] * 100 / account['observedSec'], 2)
+                if account['observedSec'] else None,
+                'relaunches': account['relaunches'],
+                'relaunchesPerHour': round(account['relaunches'] / hours, 3) if hours else None,
+                'meanTimeToRejoinSec': round(account['rejoinSec'] / account['rejoinCount'], 1)
+                if account['rejoinCount'] else None,
+                'reasons': account['reasons'],
+            })
+        # Account tệ nhất lên đầu: uptime thấp rồi tới relaunch nhiều
+        rows.sort(key=lambda row: (row['uptimePercent'] if row['uptimePercent'] is not None else 101,
+                                   -row['relaunches']))
+        return rows
+
+    @staticmethod
+    def render(rows: List[Dict], top: int):
+        table = Table(title="📊 Availability theo account", show_header=True, header_style="bold cyan",
+                      box=box.ROUNDED)
+        table.add_column("Account", overflow="fold")
+        table.add_column("Package", overflow="fold")
+        for column in ("Uptime", "Relaunch", "/giờ", "MTTR", "Giờ"):
+            table.add_column(column, no_wrap=True, justify="right")
+        table.add_column("Lý do", overflow="fold")
+
+        for row in rows[:top] if top else rows:
+            reasons = ", ".join(f"{reason}:{count}" for reason, count in
+                                sorted(row['reasons'].items(), key=lambda item: -item[1]))
+            table.add_row(
+                str(row['account']),
+                str(row['package'] or "N/A"),
+                f"{row['uptimePercent']:.1f}%" if row['uptimePercent'] is not None else "N/A",
+                str(row['relaunches']),
+                f"{row['relaunchesPerHour']:.2f}" if row['relaunchesPerHour'] is not None else "N/A",
+                f"{row['meanTimeToRejoinSec']:.0f}s" if row['meanTimeToRejoinSec'] is not None else "N/A",
+                f"{row['observedHours']:.1f}",
+                reasons or "-",
+            )
+        console.print(table)
+
+class ScreenshotCapture:
+    """Chụp màn hình qua stdout của screencap (không file tạm), thu nhỏ và nén lại trong worker thread."""
+
+    COMMANDS = [
+        ["screencap", "-p"],
+        ["/system/bin/screencap", "-p"],
+        ["su", "-c", "screencap -p"],
+    ]
+
+    _pillow_warned = False
+
+    def __init__(self, max_side: int = 960, image_format: str = "jpeg", quality: int = 60,
+                 timeout_sec: float = 10):
+        self.max_side = max_side
+        self.image_format = image_format.lower()
+        self.quality = quality
+        self.timeout_sec = timeout_sec
+        self._working_command: Optional[List[str]] = None
+
+    async def capture(self) -> Optional[Tuple[bytes, str, str]]:
+        png = await self._capture_png()
+        if png is None:
+            print("❌ Không thể chụp màn hình")
+            return None
+        return await asyncio.to_thread(self.compress, png)
+
+    async def _capture_png(self) -> Optional[bytes]:
+        # Lệnh nào chạy được thì nhớ lại, lần sau khỏi thử các biến thể lỗi
+        if self._working_command is not None:
+            commands = [self._working_command] + [c for c in self.COMMANDS if c != self._working_command]
+        else:
+            commands = self.COMMANDS
+
+        for command in commands:
+            result = await command_runner.run(command, self.timeout_sec)
+            if result.ok and result.stdout.startswith(b'\x89PNG'):
+                self._working_command = command
+                return result.stdout
+        self._working_command = None
+        return None
+
+    def compress(self, png: bytes) -> Tuple[bytes, str, str]:
+        if Image is None:
+            # Không có Pillow thì gửi nguyên PNG full size, báo một lần để biết vì sao ảnh vẫn nặng
+            if not ScreenshotCapture._pillow_warned:
+                ScreenshotCapture._pillow_warned = True
+                print(f"⚠️ Chưa có Pillow, ảnh webhook gửi nguyên PNG ({len(png) // 1024}KB) không nén. "
+                      "Cài bằng: pkg install python-pillow (hoặc pip install pillow)")
+            return png, "screenshot.png", "image/png"
+
+        with Image.open(io.BytesIO(png)) as image:
+            image = image.convert("RGB")
+            image.thumbnail((self.max_side, self.max_side))
+            output = io.BytesIO()
+            if self.image_format == "webp":
+                image.save(output, "WEBP", quality=self.quality, method=4)
+                return output.getvalue(), "screenshot.webp", "image/webp"
+            image.save(output, "JPEG", quality=self.quality, optimize=True)
+            return output.getvalue(), "screenshot.jpg", "image/jpeg"
+
+class WebhookOutbox:
+    """Hàng đợi webhook lưu trên đĩa: gộp snapshot trùng, retry backoff, sống sót qua restart."""
+
+    def __init__(self, path: Path = WEBHOOK_OUTBOX_PATH):
+        self.path = path
+        self.entries: List[Dict] = []
+        self.load()
+
+    def load(self):
+        try:
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            print(f"❌ Lỗi load webhook outbox: {e}")
+            self.entries = []
+
+    def save(self):
+        try:
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"❌ Lỗi save webhook outbox: {e}")
+
+    def _pending(self, kind: str) -> Optional[Dict]:
+        # Entry đã gửi được một phần thì không gộp thêm vào nữa
+        for entry in self.entries:
+            if entry['kind'] == kind and not entry.get('sentMessages'):
+                return entry
+        return None
+
+    def put_summary(self, data: Dict):
+        # Chỉ giữ snapshot mới nhất, snapshot cũ chưa gửi được thì bị thay thế
+        entry = self._pending('summary')
+        if entry is None:
+            entry = {'kind': 'summary', 'attempts': 0, 'nextAttemptAt': 0}
+            self.entries.append(entry)
+        entry['data'] = data
+        entry['createdAt'] = time.time()
+        self.save()
+
+    def add_change(self, change: Dict):
+        entry = self._pending('change')
+        if entry is None:
+            entry = {'kind': 'change', 'attempts': 0, 'nextAttemptAt': 0, 'createdAt': time.time(),
+                     'data': {'changes': []}}
+            self.entries.append(entry)
+        # Một package đổi nhiều lần trước khi gửi thì gộp lại thành một dòng from → to mới nhất
+        changes = entry['data']['changes']
+        for existing in changes:
+            if existing['packageName'] == change['packageName']:
+                existing.update(to=change['to'], at=change['at'])
+                if existing['from'] == existing['to']:
+                    changes.remove(existing)
+                break
+        else:
+            changes.append(change)
+        if not changes:
+            self.entries.remove(entry)
+        self.save()
+
+    def next_ready(self, now: float) -> Optional[Dict]:
+        ready = [entry for entry in self.entries if entry['nextAttemptAt'] <= now]
+        if not ready:
+            return None
+        # Báo thay đổi trạng thái được ưu tiên hơn summary định kỳ
+        return min(ready, key=lambda entry: (entry['kind'] != 'change', entry['createdAt']))
+
+    def next_attempt_at(self) -> Optional[float]:
+        if not self.entries:
+            return None
+        return min(entry['nextAttemptAt'] for entry in self.entries)
+
+    def remove(self, entry: Dict):
+        if entry in self.entries:
+            self.entries.remove(entry)
+        self.save()
+
+    def retry_later(self, entry: Dict, wait: float, base_sec: float, max_sec: float):
+        entry['attempts'] += 1
+        backoff = min(max_sec, base_sec * (2 ** (entry['attempts'] - 1)))
+        # Discord đã báo retry_after thì chờ đúng chừng đó, không thì backoff lũy thừa
+        entry['nextAttemptAt'] = time.time() + (wait if wait > 0 else backoff)
+        self.save()
+
+class WebhookManager:
+    def __init__(self, settings: Optional[Dict] = None):
+        settings = settings or DEFAULT_SETTINGS
         self.webhook_url = None
         self.device_name = None
         self.interval = None
+        self.mode = 'periodic'
         self.enabled = False
         self.last_sent_time = 0
+        self.outbox = WebhookOutbox()
+        self.wake_event = asyncio.Event()
+        self.attach_screenshot = True
+        self.screenshot = ScreenshotCapture(
+            settings['screenshotMaxSide'],
+            settings['screenshotFormat'],
+            settings['screenshotQuality'],
+            settings['screenshotTimeoutSec'],
+        )
         self.load_config()
 
     def load_config(self):
@@ -213,6 +988,7 @@ class WebhookManager:
                     self.webhook_url = config.get('webhook_url')
                     self.device_name = config.get('device_name', 'Unknown Device')
                     self.interval = config.get('interval', 60)
+                    self.mode = config.get('mode', 'periodic')
                     self.enabled = config.get('enabled', False) and self.webhook_url
         except Exception as e:
             print(f"❌ Lỗi load webhook config: {e}")
@@ -223,6 +999,7 @@ class WebhookManager:
                 'webhook_url': self.webhook_url,
                 'device_name': self.device_name,
                 'interval': self.interval,
+                'mode': self.mode,
                 'enabled': self.enabled
             }
             with open(WEBHOOK_CONFIG_PATH, 'w', encoding='utf-8') as f:
@@ -243,10 +1020,13 @@ class WebhookManager:
             device_name = input("Nhập tên thiết bị: ").strip() or "Multi Dawn Device"
             interval = input("Nhập interval (phút, mặc định 60): ").strip()
             interval = int(interval) if interval.isdigit() else 60
+            print("Chế độ gửi: 1. Chỉ summary định kỳ | 2. Summary định kỳ + báo ngay khi instance đổi trạng thái")
+            mode = 'change' if input("Chọn chế độ (mặc định 1): ").strip() == "2" else 'periodic'
             
             self.webhook_url = webhook_url
             self.device_name = device_name
             self.interval = interval
+            self.mode = mode
             self.enabled = True
             
             self.save_config()
@@ -255,44 +1035,31 @@ class WebhookManager:
         except Exception as e:
             print(f"❌ Lỗi cấu hình webhook: {e}")
 
-    def capture_screenshot(self):
+    async def capture_screenshot(self) -> Optional[Tuple[bytes, str, str]]:
         try:
-            screenshot_path = "/data/data/com.termux/files/home/screenshot.png"
-            commands = [
-                f"screencap -p {screenshot_path}",
-                f"su -c screencap -p {screenshot_path}",
-                f"/system/bin/screencap -p {screenshot_path}"
-            ]
-            
-            for cmd in commands:
-                try:
-                    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-                    if result.returncode == 0 and os.path.exists(screenshot_path):
-                        return screenshot_path
-                except:
-                    continue
-            
-            print("❌ Không thể chụp màn hình")
-            return None
+            return await self.screenshot.capture()
         except Exception as e:
             print(f"❌ Lỗi chụp màn hình: {e}")
             return None
 
     def get_system_info(self):
         try:
-            cpu_usage = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
+            sample = metrics_sampler.latest()
+            if sample is None:
+                print("❌ Chưa có số liệu hệ thống từ metrics sampler")
+                return None
+            # CPU lấy trung bình 1 phút gần nhất thay vì đo chặn 1 giây
+            cpu_usage = metrics_sampler.average('cpuPercent', 60)
             
             system_info = {
                 "cpu_usage": f"{cpu_usage:.1f}%",
-                "memory_used": f"{memory.used / (1024**3):.2f}GB",
-                "memory_total": f"{memory.total / (1024**3):.2f}GB",
-                "memory_percent": f"{memory.percent:.1f}%",
-                "disk_used": f"{disk.used / (1024**3):.2f}GB",
-                "disk_total": f"{disk.total / (1024**3):.2f}GB",
-                "disk_percent": f"{disk.percent:.1f}%",
-                "uptime": self.get_uptime(),
+                "memory_used": f"{sample['memoryUsed'] / (1024**3):.2f}GB",
+                "memory_total": f"{sample['memoryTotal'] / (1024**3):.2f}GB",
+                "memory_percent": f"{sample['memoryPercent']:.1f}%",
+                "disk_used": f"{sample['diskUsed'] / (1024**3):.2f}GB",
+                "disk_total": f"{sample['diskTotal'] / (1024**3):.2f}GB",
+                "disk_percent": f"{sample['diskPercent']:.1f}%",
+                "uptime": self.get_uptime(sample['uptimeSec']),
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
             return system_info
@@ -300,11 +1067,8 @@ class WebhookManager:
             print(f"❌ Lỗi lấy system info: {e}")
             return None
 
-    def get_uptime(self):
+    def get_uptime(self, uptime_seconds: float):
         try:
-            with open('/proc/uptime', 'r') as f:
-                uptime_seconds = float(f.readline().split()[0])
-            
             days = int(uptime_seconds // (24 * 3600))
             hours = int((uptime_seconds % (24 * 3600)) // 3600)
             minutes = int((uptime_seconds % 3600) // 60)
@@ -313,169 +1077,413 @@ class WebhookManager:
         except:
             return "Unknown"
 
-    def send_webhook(self, instances: List[Dict] = None):
-        if not self.enabled or not self.webhook_url:
-            return False
-
-        try:
-            current_time = time.time()
-            if current_time - self.last_sent_time < self.interval * 60:
-                return False
-
-            print("📊 Đang gửi webhook...")
-            
-            screenshot_path = self.capture_screenshot()
-            
-            system_info = self.get_system_info()
-            if not system_info:
-                return False
+    @staticmethod
+    def snapshot_instances(instances: Optional[List['InstanceState']]) -> List[Dict]:
+        return [
+            {
+                'packageName': instance.package_name,
+                'username': instance.config.username,
+                'status': instance.status,
+            }
+            for instance in instances or []
+        ]
 
-            instances_info = ""
-            if instances:
-                for i, instance in enumerate(instances, 1):
-                    package_name = instance.get('packageName', 'Unknown')
-                    status = instance.get('status', 'Unknown')
-                    username = instance.get('config', {}).get('username', 'Unknown')
-                    
-                    masked_username = username[:3] + "***" if len(username) > 3 else username
-                    
-                    instances_info += f"{i}. {package_name} ({masked_username}) - {status}\n"
-            else:
-                instances_info = "Không có instances đang chạy"
+    @staticmethod
+    def mask_username(username: str) -> str:
+        return username[:3] + "***" if len(username) > 3 else username
 
-            random_color = random.randint(0, 16777215)
-            
-            embed = {
-                "color": random_color,
-                "title": "📈 Multi Rejoin Ngan - System Status",
-                "description": f"Real-time report for **{self.device_name}**",
-                "fields": [
-                    {
-                        "name": "💻 CPU Usage",
-                        "value": f"```{system_info['cpu_usage']}```",
-                        "inline": True
-                    },
-                    {
-                        "name": "🧠 Memory Usage",
-                        "value": f"```{system_info['memory_used']} / {system_info['memory_total']} ({system_info['memory_percent']})```",
-                        "inline": True
-                    },
-                    {
-                        "name": "💾 Disk Usage",
-                        "value": f"```{system_info['disk_used']} / {system_info['disk_total']} ({system_info['disk_percent']})```",
-                        "inline": True
-                    },
-                    {
-                        "name": "⏰ Uptime",
-                        "value": f"```{system_info['uptime']}```",
-                        "inline": True
-                    },
-                    {
-                        "name": "🕐 Last Update",
-                        "value": f"```{system_info['timestamp']}```",
-                        "inline": True
-                    },
-                    {
-                        "name": "🎮 Running Instances",
-                        "value": f"```{instances_info}```",
-                        "inline": False
-                    }
-                ],
-                "footer": {
-                    "text": "Ngan Rejoin Tool | Made with ❤️",
-                    "icon_url": "https://cdn.discordapp.com/attachments/1269331861902196902/1422144505485721653/1.png?ex=68db9ac8&is=68da4948&hm=a7ed4d0a5740ff876e12b22f94f3e14df81d5396fb504b52251f1382e65d1211&"
-                },
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "author": {
-                    "name": "Rejoin By Ngan",
-                    "icon_url": "https://cdn.discordapp.com/attachments/1269331861902196902/1422144505485721653/1.png?ex=68db9ac8&is=68da4948&hm=a7ed4d0a5740ff876e12b22f94f3e14df81d5396fb504b52251f1382e65d1211&"
-                }
+    @staticmethod
+    def chunk_lines(lines: List[str], limit: int = FIELD_VALUE_LIMIT) -> List[str]:
+        # Mỗi field Discord tối đa 1024 ký tự (tính cả ```), chia dòng thành nhiều field
+        chunks, current = [], ""
+        for line in lines:
+            line = line[:limit - 1]
+            if current and len(current) + len(line) + 1 > limit:
+                chunks.append(current)
+                current = ""
+            current += line + "\n"
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def base_embed(self, title: str, description: str) -> Dict:
+        return {
+            "color": random.randint(0, 16777215),
+            "title": title,
+            "description": description,
+            "fields": [],
+            "footer": {
+                "text": "Ngan Rejoin Tool | Made with ❤️",
+                "icon_url": WEBHOOK_ICON_URL
+            },
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "author": {
+                "name": "Rejoin By Ngan",
+                "icon_url": WEBHOOK_ICON_URL
             }
+        }
 
-            payload = {
-                "embeds": [embed],
+    @staticmethod
+    def embed_size(embed: Dict) -> int:
+        size = len(embed.get('title', '')) + len(embed.get('description', '')) + len(embed['footer']['text'])
+        size += len(embed['author']['name'])
+        return size + sum(len(field['name']) + len(field['value']) for field in embed['fields'])
+
+    def pack_messages(self, first_embed: Dict, fields: List[Dict], title: str) -> List[Dict]:
+        """Xếp field vào embed/message theo giới hạn Discord (25 field/embed, 10 embed và 6000 ký tự/message)."""
+        messages = [[first_embed]]
+        message_size = self.embed_size(first_embed)
+
+        for field in fields:
+            field_size = len(field['name']) + len(field['value'])
+            embed = messages[-1][-1]
+            if message_size + field_size > MESSAGE_CHAR_LIMIT:
+                embed = self.base_embed(title, f"Tiếp theo cho **{self.device_name}**")
+                messages.append([embed])
+                message_size = self.embed_size(embed)
+            elif len(embed['fields']) >= EMBED_FIELD_LIMIT:
+                embed = self.base_embed(title, f"Tiếp theo cho **{self.device_name}**")
+                if len(messages[-1]) >= MESSAGE_EMBED_LIMIT:
+                    messages.append([])
+                    message_size = 0
+                messages[-1].append(embed)
+                message_size += self.embed_size(embed)
+            embed['fields'].append(field)
+            message_size += field_size
+
+        return [
+            {
+                "embeds": embeds,
                 "username": "Rejoin By Ngan🔥",
-                "avatar_url": "https://cdn.discordapp.com/attachments/1269331861902196902/1422144505485721653/1.png?ex=68db9ac8&is=68da4948&hm=a7ed4d0a5740ff876e12b22f94f3e14df81d5396fb504b52251f1382e65d1211&"
+                "avatar_url": WEBHOOK_ICON_URL
+            }
+            for embeds in messages
+        ]
+
+    def build_payloads(self, snapshot: Dict) -> List[Dict]:
+        system_info = snapshot['systemInfo']
+        lines = [
+            f"{i}. {item['packageName']} ({self.mask_username(item['username'])}) - {item['status']}"
+            for i, item in enumerate(snapshot['instances'], 1)
+        ] or ["Không có instances đang chạy"]
+
+        embed = self.base_embed("📈 Multi Rejoin Ngan - System Status",
+                                f"Real-time report for **{self.device_name}**")
+        embed['fields'] = [
+            {
+                "name": "💻 CPU Usage",
+                "value": f"```{system_info['cpu_usage']}```",
+                "inline": True
+            },
+            {
+                "name": "🧠 Memory Usage",
+                "value": f"```{system_info['memory_used']} / {system_info['memory_total']} ({system_info['memory_percent']})```",
+                "inline": True
+            },
+            {
+                "name": "💾 Disk Usage",
+                "value": f"```{system_info['disk_used']} / {system_info['disk_total']} ({system_info['disk_percent']})```",
+                "inline": True
+            },
+            {
+                "name": "⏰ Uptime",
+                "value": f"```{system_info['uptime']}```",
+                "inline": True
+            },
+            {
+                "name": "🕐 Last Update",
+                "value": f"```{system_info['timestamp']}```",
+                "inline": True
+            },
+        ]
+
+        chunks = self.chunk_lines(lines)
+        fields = [
+            {
+                "name": "🎮 Running Instances" if len(chunks) == 1 else f"🎮 Running Instances ({i}/{len(chunks)})",
+                "value": f"```{chunk}```",
+                "inline": False
             }
+            for i, chunk in enumerate(chunks, 1)
+        ]
+        return self.pack_messages(embed, fields, "📈 Multi Rejoin Ngan - System Status")
+
+    def build_change_payloads(self, changes: List[Dict]) -> List[Dict]:
+        lines = [
+            f"{change['at']} {change['packageName']} ({self.mask_username(change['username'])}): "
+            f"{change['from']} → {change['to']}"
+            for change in changes
+        ]
+        embed = self.base_embed("🔔 Multi Rejoin Ngan - Status Change",
+                                f"Instance đổi trạng thái trên **{self.device_name}**")
+        fields = [
+            {"name": "🔄 Thay đổi", "value": f"```{chunk}```", "inline": False}
+            for chunk in self.chunk_lines(lines)
+        ]
+        return self.pack_messages(embed, fields, "🔔 Multi Rejoin Ngan - Status Change")
+
+    def notify_change(self, instance: 'InstanceState', old_status: str, new_status: str):
+        if not self.enabled or self.mode != 'change':
+            return
+        self.outbox.add_change({
+            'packageName': instance.package_name,
+            'username': instance.config.username,
+            'from': old_status,
+            'to': new_status,
+            'at': datetime.now().strftime("%H:%M:%S"),
+        })
+        self.wake_event.set()
+
+    async def post_payload(self, session: aiohttp.ClientSession, payload: Dict,
+                           screenshot: Optional[Tuple[bytes, str, str]], timeout_sec: float) -> Tuple[bool, float]:
+        """Trả về (thành công, số giây phải chờ theo rate limit của Discord)."""
+        if screenshot:
+            image_bytes, filename, content_type = screenshot
+            data = aiohttp.FormData()
+            data.add_field('payload_json', json.dumps(payload), content_type='application/json')
+            data.add_field('file', image_bytes, filename=filename, content_type=content_type)
+            request_kwargs = {'data': data}
+        else:
+            request_kwargs = {'json': payload}
 
-            files = {}
-            if screenshot_path and os.path.exists(screenshot_path):
-                with open(screenshot_path, 'rb') as f:
-                    files['file'] = ('screenshot.png', f, 'image/png')
-                    response = requests.post(
-                        self.webhook_url,
-                        data={"payload_json": json.dumps(payload)},
-                        files=files
-                    )
-            else:
-                response = requests.post(
-                    self.webhook_url,
-                    json=payload
-                )
+        timeout = aiohttp.ClientTimeout(total=timeout_sec)
+        async with session.post(self.webhook_url, timeout=timeout, **request_kwargs) as response:
+            body = await response.read()
+            status = response.status
+            headers = response.headers
 
-            if response.status_code in [200, 204]:
-                print("✅ Đã gửi webhook thành công!")
-                self.last_sent_time = current_time
-                
-                if screenshot_path and os.path.exists(screenshot_path):
-                    try:
-                        os.remove(screenshot_path)
-                    except:
-                        pass
-                return True
-            else:
-                print(f"❌ Lỗi gửi webhook: {response.status_code}")
-                return False
+        wait = 0.0
+        try:
+            if headers.get('X-RateLimit-Remaining') == '0':
+                wait = float(headers.get('X-RateLimit-Reset-After', 0))
+        except ValueError:
+            pass
 
-        except Exception as e:
-            print(f"❌ Lỗi gửi webhook: {e}")
-            return False
-def detect_roblox_packages_by_keywords():
-    keywords = [
-        # ===== ORIGINAL (GIỮ NGUYÊN) =====
-        "roblox", "bduy", "mangcut", "concacug", "louis", "zamdepzai",
-        "ugpornkiki", "zam.nagy", "fynix.clone", "arya",
+        if status == 429:
+            try:
+                wait = max(wait, float(json.loads(body).get('retry_after', 0)))
+            except (ValueError, AttributeError):
+                wait = max(wait, RateLimiter.parse_retry_after(headers, 5))
+            print(f"⏳ Discord rate limit, chờ {wait:.1f}s")
+            return False, wait
+
+        if status in [200, 204]:
+            return True, wait
+
+        print(f"❌ Lỗi gửi webhook: {status}")
+        return False, wait
+
+    async def deliver(self, session: aiohttp.ClientSession, entry: Dict, timeout_sec: float) -> Tuple[bool, float]:
+        if entry['kind'] == 'summary':
+            payloads = self.build_payloads(entry['data'])
+            screenshot = await self.capture_screenshot() if self.attach_screenshot else None
+        else:
+            payloads = self.build_change_payloads(entry['data']['changes'])
+            screenshot = None
+
+        # Gửi lần lượt từng message, đã gửi xong phần nào thì bỏ phần đó khỏi entry
+        sent = entry.get('sentMessages', 0)
+        for index in range(sent, len(payloads)):
+            ok, wait = await self.post_payload(session, payloads[index], screenshot if index == 0 else None,
+                                               timeout_sec)
+            if not ok:
+                return False, wait
+            entry['sentMessages'] = index + 1
+            self.outbox.save()
+            if wait > 0 and index + 1 < len(payloads):
+                await asyncio.sleep(wait)
+        return True, 0.0
+
+    def build_snapshot(self, instances: Optional[List['InstanceState']]) -> Optional[Dict]:
+        system_info = self.get_system_info()
+        if not system_info:
+            return None
+        return {
+            'systemInfo': system_info,
+            'instances': self.snapshot_instances(instances),
+        }
+
+    async def run_worker(self, http: 'HttpClient', get_snapshot, settings: Dict):
+        """Worker webhook duy nhất trên event loop: luôn chỉ có tối đa một lần gửi đang chạy."""
+        if not self.enabled or not self.webhook_url:
+            return
+
+        next_summary = time.time() + settings['webhookInitialDelaySec']
+        blocked_until = 0.0
+
+        while True:
+            self.wake_event.clear()
+            now = time.time()
 
-        # ===== ROBLOX CLONE / MOD =====
+            if now >= next_summary:
+                # Lỗi dựng snapshot (vd dữ liệu lạ từ aggregator) chỉ bỏ lượt này, worker vẫn chạy tiếp
+                try:
+                    snapshot = get_snapshot()
+                    if snapshot:
+                        self.outbox.put_summary(snapshot)
+                except Exception as e:
+                    print(f"❌ Lỗi tạo snapshot webhook: {e}")
+                next_summary = now + self.interval * 60
+
+            entry = self.outbox.next_ready(now) if now >= blocked_until else None
+            if entry is not None:
+                print("📊 Đang gửi webhook...")
+                try:
+                    ok, wait = await self.deliver(http.get_session(), entry, settings['webhookTimeoutSec'])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"❌ Lỗi gửi webhook: {e}")
+                    ok, wait = False, 0.0
+
+                if ok:
+                    print("✅ Đã gửi webhook thành công!")
+                    self.last_sent_time = time.time()
+                    self.outbox.remove(entry)
+                else:
+                    self.outbox.retry_later(entry, wait, settings['webhookRetrySec'], settings['webhookMaxBackoffSec'])
+                blocked_until = time.time() + wait
+                continue
+
+            wake_at = next_summary
+            next_attempt = self.outbox.next_attempt_at()
+            if next_attempt is not None:
+                wake_at = min(wake_at, max(next_attempt, blocked_until))
+            try:
+                await asyncio.wait_for(self.wake_event.wait(), max(0.0, wake_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+class PackageIndex:
+    """Danh sách package Roblox/clone dùng chung cho mọi chức năng, cache theo mtime của package database."""
+
+    KEYWORDS = [
+        "roblox", "bduy", "mangcut", "concacug", "louis", "zamdepzai",
+        "ugpornkiki", "zam.nagy", "fynix.clone", "arya", "tencent", "meow",
         "robloxmod", "robloxclone", "rbxclone", "rbxmod",
         "robloxmulti", "multiroblox", "robloxdual", "roblox2",
         "robloxplus", "robloxx", "robloxalt",
-
-        # ===== EXECUTOR / TOOL NAME =====
         "delta", "codex", "fluxus", "arceus", "hydrogen",
         "krnl", "synapse", "electron", "evon", "scriptware",
-
-        # ===== PRIVATE / CUSTOM BUILD =====
         "private", "custom", "build", "patched", "modified",
         "inject", "loader", "bypass", "stealth",
-
-        # ===== USER / DEV TAG =====
         "dev", "owner", "admin", "test", "beta",
         "release", "pro", "vip", "premium",
-
-        # ===== ANDROID / MOBILE =====
         "android", "mobile", "apk", "client",
         "arm", "arm64", "v7a", "v8a",
-
-        # ===== MULTI / FARM =====
         "multi", "clone", "farm", "auto",
         "bot", "afk", "grind",
-
-        # ===== RANDOM TAGS =====
         "shadow", "ghost", "night", "dark",
         "zero", "neo", "alpha", "omega",
-        "x1", "x2", "x3", "promax"
+        "x1", "x2", "x3", "promax",
     ]
+    # Tên package chứa các từ này thì chắc chắn là Roblox/clone, không cần xác nhận thêm
+    TRUSTED_KEYWORDS = ["roblox", "arya"]
+
+    PACKAGE_DB_PATHS = [Path("/data/system/packages.list"), Path("/data/system/packages.xml")]
+
+    def __init__(self, cache_path: Path = PACKAGE_INDEX_PATH):
+        self.cache_path = cache_path
+        # Một regex cho cả list keyword, từ dài đứng trước để alternation khớp đúng
+        self.matcher = re.compile("|".join(
+            re.escape(keyword) for keyword in sorted(set(self.KEYWORDS), key=len, reverse=True)))
+        self.trusted_matcher = re.compile("|".join(re.escape(keyword) for keyword in self.TRUSTED_KEYWORDS))
+        self._lock = threading.Lock()
+        self._cache_key: Optional[List] = None
+        self._packages: Optional[List[str]] = None
+        self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            self._cache_key = cached['key']
+            self._packages = cached['packages']
+        except Exception:
+            self._cache_key = None
+            self._packages = None
+
+    def _save_cache(self):
+        try:
+            temp_path = self.cache_path.with_suffix(".tmp")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': self._cache_key, 'packages': self._packages}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
 
-    pkgs = []
-    result = os.popen("pm list packages").read().splitlines()
+    def database_key(self) -> Optional[List]:
+        # Cài/gỡ app nào thì package database cũng được ghi lại, mtime đổi là đủ biết cache cũ
+        for path in self.PACKAGE_DB_PATHS:
+            try:
+                stat = path.stat()
+                return [str(path), stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                continue
+        return None
+
+    def installed_packages(self) -> List[str]:
+        # Đọc thẳng packages.list (cần root) để khỏi khởi động JVM của pm; cùng file với key của cache
+        try:
+            with open(self.PACKAGE_DB_PATHS[0], 'r', encoding='utf-8', errors='replace') as f:
+                return [line.split(' ', 1)[0] for line in f if line.strip()]
+        except OSError:
+            pass
+        result = command_runner.run_blocking(["pm", "list", "packages"])
+        return [line.replace("package:", "").strip() for line in result.text.splitlines() if line.strip()]
+
+    @staticmethod
+    def roblox_handlers() -> Optional[set]:
+        """Các package có activity nhận intent roblox:// (chính là activity Utils.launch gọi tới)."""
+        result = command_runner.run_blocking(["cmd", "package", "query-activities", "--brief",
+                                              "-a", "android.intent.action.VIEW", "-d", "roblox://"])
+        if not result.ok:
+            return None
+        handlers = set(re.findall(r"packageName=([\w.]+)", result.text))
+        handlers.update(re.findall(r"^\s*([A-Za-z][\w.]*)/[\w.$]+", result.text, re.MULTILINE))
+        return handlers
+
+    def scan(self) -> List[str]:
+        candidates = [name for name in self.installed_packages() if self.matcher.search(name.lower())]
+        handlers = self.roblox_handlers()
+        if handlers is None:
+            # Máy không có `cmd package query-activities` thì chỉ tin các tên chắc chắn
+            return [name for name in candidates if self.trusted_matcher.search(name.lower())]
+        return [name for name in candidates if name in handlers]
+
+    def packages(self, refresh: bool = False) -> List[str]:
+        with self._lock:
+            key = self.database_key()
+            if refresh or key is None or key != self._cache_key or self._packages is None:
+                self._packages = list(dict.fromkeys(self.scan()))
+                self._cache_key = key
+                if key is not None:
+                    self._save_cache()
+            return list(self._packages)
+
+    async def packages_async(self, refresh: bool = False) -> List[str]:
+        return await asyncio.to_thread(self.packages, refresh)
 
-    for line in result:
-        pkg = line.replace("package:", "").strip().lower()
-        if any(k in pkg for k in keywords):
-            pkgs.append(pkg)
+    @staticmethod
+    def display_name(package_name: str) -> str:
+        if package_name == 'com.roblox.client':
+            return 'Roblox Quốc tế 🌍'
+        elif package_name == 'com.roblox.client.vnggames':
+            return 'Roblox VNG 🇻🇳'
+        elif package_name in ARYA_PACKAGES:
+            # Lấy ký tự cuối cùng từ package name (v, w, x, y, z)
+            version = package_name[-1].upper()
+            return f'Arya Client {version} 🔥'
+        elif 'roblox' in package_name.lower():
+            return f'Roblox Custom ({package_name}) 🎮'
+        elif 'arya' in package_name.lower():
+            return f'Arya Client ({package_name}) ⚡'
+        return f'Unknown ({package_name}) ❓'
+
+package_index = PackageIndex()
 
-    return list(dict.fromkeys(pkgs))  # remove duplicate
+def detect_roblox_packages_by_keywords():
+    return package_index.packages()
 
 
 def logout_current_account(pkg: str):
@@ -503,7 +1511,7 @@ def logout_current_account(pkg: str):
         conn.close()
 
         # kill app để cookie áp dụng
-        os.system(f"am force-stop {pkg}")
+        command_runner.run_blocking(["am", "force-stop", pkg])
 
         msg(f"Logged out  account : {pkg}", "ok")
 
@@ -833,7 +1841,7 @@ class CookieInjector:
 
             for pkg in detect_roblox_packages_by_keywords():
 
-                os.system(f"pkill -f {pkg}")
+                command_runner.run_blocking(["pkill", "-f", pkg])
 
         except Exception:
 
@@ -941,7 +1949,9 @@ class Utils:
             if os.getuid() != 0:
                 print("Cần quyền root, chuyển qua su...")
                 python_path = "/data/data/com.termux/files/usr/bin/python"
-                subprocess.run(f"su -c '{python_path} {__file__}'", shell=True, check=True)
+                # Giữ nguyên tham số dòng lệnh (vd --run) khi chạy lại dưới su
+                command = shlex.join([python_path, __file__, *sys.argv[1:]])
+                subprocess.run(f"su -c {shlex.quote(command)}", shell=True, check=True)
                 sys.exit(0)
         except AttributeError:
             pass
@@ -951,22 +1961,25 @@ class Utils:
 
     @staticmethod
     def enable_wake_lock():
-        try:
-            subprocess.run("termux-wake-lock", shell=True, check=False)
-            print("Wake lock bật ⚡")
-        except:
+        result = command_runner.run_blocking(["termux-wake-lock"])
+        if result.returncode == 127:
             print("Không bật được wake lock 😅")
+        else:
+            print("Wake lock bật ⚡")
 
     @staticmethod
     async def kill_app(package_name: str):
         try:
             print(f"💀 [{package_name}] Đang kill app...")
-            subprocess.run(f"am force-stop {package_name}", shell=True, check=False, 
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            print(f"✅ [{package_name}] Đã kill thành công!")
-            await asyncio.sleep(1)
+            result = await command_runner.run(["am", "force-stop", package_name])
+            if result.ok:
+                print(f"✅ [{package_name}] Đã kill thành công!")
+            else:
+                print(f"❌ [{package_name}] Lỗi khi kill app: {result.error}")
         except Exception as e:
             print(f"❌ [{package_name}] Lỗi khi kill app: {e}")
+        # Kill lỗi/timeout thì process có thể đang chết dở, vẫn chờ 1s như cũ trước khi launch
+        await asyncio.sleep(1)
 
     @staticmethod
     async def launch(place_id: str, link_code: Optional[str], package_name: str):
@@ -983,11 +1996,14 @@ class Utils:
         else:
             activity = "com.roblox.client.ActivityProtocolLaunch"
 
-        command = f'am start -n {package_name}/{activity} -a android.intent.action.VIEW -d "{url}" --activity-clear-top'
+        command = ["am", "start", "-n", f"{package_name}/{activity}", "-a", "android.intent.action.VIEW",
+                   "-d", url, "--activity-clear-top"]
         
         try:
-            subprocess.run(command, shell=True, check=False,
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            result = await command_runner.run(command)
+            if not result.ok:
+                print(f"❌ [{package_name}] Launch failed: {result.error}")
+                return
             print(f"✅ [{package_name}] Launch command executed!")
         except Exception as e:
             print(f"❌ [{package_name}] Launch failed: {e}")
@@ -1006,82 +2022,75 @@ class Utils:
             print(f"❌ Không thể lưu configs: {e}")
 
     @staticmethod
-    def load_multi_configs() -> Dict:
-        if not CONFIG_PATH.exists():
+    def session_key(cookie: str) -> str:
+        # Chỉ lưu hash để nhận ra cookie đã đổi, không ghi cookie ra config
+        return hashlib.sha256(cookie.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def load_multi_configs(path: Path = CONFIG_PATH) -> Dict:
+        if not path.exists():
             return {}
         try:
-            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except:
             return {}
 
     @staticmethod
-    def detect_all_roblox_packages() -> Dict:
+    def load_tool_settings() -> Dict:
+        settings = dict(DEFAULT_SETTINGS)
+        if not SETTINGS_PATH.exists():
+            return settings
+        try:
+            with open(SETTINGS_PATH, 'r', encoding='utf-8') as f:
+                settings.update(json.load(f))
+        except Exception as e:
+            print(f"❌ Không thể đọc {SETTINGS_PATH.name}: {e}")
+        return settings
+
+    @staticmethod
+    async def detect_all_roblox_packages() -> Dict:
         packages = {}
         
         try:
-            # Tìm các package Roblox thông thường
-            result = subprocess.run("pm list packages | grep -E 'com.roblox|com.arya.clien'", 
-                                  shell=True, capture_output=True, text=True)
-            lines = [line for line in result.stdout.split('\n') if line]
-            
-            for line in lines:
-                match = re.search(r'package:(com\.[^\s]+)', line)
-                if match:
-                    package_name = match.group(1)
-                    
-                    # Xác định display name dựa trên package
-                    if package_name == 'com.roblox.client':
-                        display_name = 'Roblox Quốc tế 🌍'
-                    elif package_name == 'com.roblox.client.vnggames':
-                        display_name = 'Roblox VNG 🇻🇳'
-                    elif package_name in ARYA_PACKAGES:
-                        # Lấy ký tự cuối cùng từ package name (v, w, x, y, z)
-                        version = package_name[-1].upper()
-                        display_name = f'Arya Client {version} 🔥'
-                    elif 'roblox' in package_name.lower():
-                        display_name = f'Roblox Custom ({package_name}) 🎮'
-                    elif 'arya' in package_name.lower():
-                        display_name = f'Arya Client ({package_name}) ⚡'
-                    else:
-                        display_name = f'Unknown ({package_name}) ❓'
-                    
-                    packages[package_name] = {
-                        'packageName': package_name,
-                        'displayName': display_name
-                    }
-            
-            # Thêm các package Arya nếu chưa được tìm thấy
-            for arya_pkg in ARYA_PACKAGES:
-                if arya_pkg not in packages:
-                    version = arya_pkg[-1].upper()
-                    packages[arya_pkg] = {
-                        'packageName': arya_pkg,
-                        'displayName': f'Arya Client {version} 🔥'
-                    }
-                    
+            for package_name in await package_index.packages_async():
+                packages[package_name] = {
+                    'packageName': package_name,
+                    'displayName': PackageIndex.display_name(package_name)
+                }
         except Exception as e:
             print(f"❌ Lỗi khi quét packages: {e}")
 
         return packages
 
     @staticmethod
-    def get_roblox_cookie(package_name: str) -> Optional[str]:
+    async def get_roblox_cookie(package_name: str) -> Optional[str]:
         print(f"🍪 [{package_name}] Đang lấy cookie ROBLOSECURITY...")
-        
+
         try:
-            cmd = f"cat /data/data/{package_name}/app_webview/Default/Cookies | strings | grep ROBLOSECURITY"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            raw = result.stdout
-        except:
-            try:
-                cmd = f"su -c sh -c 'cat /data/data/{package_name}/app_webview/Default/Cookies | strings | grep ROBLOSECURITY'"
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-                raw = result.stdout
-            except Exception:
+            cookie_value = await cookie_store.read_async(package_name)
+            if cookie_value:
+                return f".ROBLOSECURITY={cookie_value}"
+            print(f"❌ [{package_name}] Không tìm được cookie ROBLOSECURITY!")
+            return None
+        except (OSError, sqlite3.Error):
+            # Không mở được DB trong process (thiếu quyền, DB hỏng...) thì quay về cách đọc bằng cat/su
+            pass
+
+        cookie_db = CookieStore.db_path(package_name)
+        result = await command_runner.run(["cat", cookie_db])
+        if not result.ok:
+            result = await command_runner.run(["su", "-c", f"cat {cookie_db}"])
+            if not result.ok:
                 print(f"❌ [{package_name}] Không thể đọc cookie bằng cả 2 cách.")
                 return None
 
+        # Tương đương `strings | grep ROBLOSECURITY` nhưng làm ngay trong process
+        raw = "\n".join(
+            chunk.decode('ascii') for chunk in re.findall(rb'[\x20-\x7e\t]{4,}', result.stdout)
+            if b'ROBLOSECURITY' in chunk
+        )
+
         match = re.search(r'\.ROBLOSECURITY_([^\s/]+)', raw)
         if not match:
             print(f"❌ [{package_name}] Không tìm được cookie ROBLOSECURITY!")
@@ -1093,6 +2102,120 @@ class Utils:
         
         return f".ROBLOSECURITY={cookie_value}"
 
+class CookieStore:
+    """Đọc .ROBLOSECURITY thẳng từ file SQLite Cookies của WebView, cache theo mtime của DB và WAL."""
+
+    QUERY = ("SELECT value FROM cookies WHERE host_key = '.roblox.com' AND name = '.ROBLOSECURITY' "
+             "ORDER BY last_access_utc DESC LIMIT 1")
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[Tuple, Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def db_path(package_name: str) -> str:
+        return f"/data/data/{package_name}/app_webview/Default/Cookies"
+
+    @staticmethod
+    def file_key(path: str) -> Tuple:
+        stat = os.stat(path)
+        # Cookie mới có thể chỉ nằm trong file -wal khi app chưa checkpoint
+        try:
+            wal_stat = os.stat(path + "-wal")
+            wal_key = (wal_stat.st_mtime_ns, wal_stat.st_size)
+        except OSError:
+            wal_key = None
+        return stat.st_mtime_ns, stat.st_size, wal_key
+
+    @staticmethod
+    def query(path: str) -> Optional[str]:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=2)
+        try:
+            try:
+                row = connection.execute(CookieStore.QUERY).fetchone()
+            except sqlite3.OperationalError:
+                # WebView cũ không có cột last_access_utc
+                row = connection.execute(CookieStore.QUERY.split(" ORDER BY")[0]).fetchone()
+        finally:
+            connection.close()
+        if not row or not row[0]:
+            return None
+        return row[0]
+
+    def read(self, package_name: str) -> Optional[str]:
+        path = self.db_path(package_name)
+        key = self.file_key(path)
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        value = self.query(path)
+        with self._lock:
+            self._cache[path] = (key, value)
+        return value
+
+    async def read_async(self, package_name: str) -> Optional[str]:
+        # Chạy trong thread nên gather nhiều package thì các DB được đọc song song
+        return await asyncio.to_thread(self.read, package_name)
+
+cookie_store = CookieStore()
+
+class LaunchAdmission:
+    """Hàng đợi cold start: chỉ cho mở thêm app khi RAM/CPU còn dư và chưa quá số launch đồng thời."""
+
+    def __init__(self, max_concurrent: int = 2, min_free_memory_percent: float = 15,
+                 max_cpu_percent: float = 85, max_wait_sec: float = 180, poll_sec: float = 1):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.min_free_memory_percent = min_free_memory_percent
+        self.max_cpu_percent = max_cpu_percent
+        self.max_wait_sec = max_wait_sec
+        self.poll_sec = poll_sec
+        self.active = 0
+        self._queue = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def check_resources(self) -> Tuple[bool, str]:
+        sample = metrics_sampler.latest()
+        if sample is None:
+            return True, ""
+        free_percent = sample['memoryAvailable'] * 100 / sample['memoryTotal']
+        cpu_percent = sample['cpuPercent']
+
+        if free_percent < self.min_free_memory_percent:
+            return False, f"RAM trống {free_percent:.0f}% < {self.min_free_memory_percent}%"
+        if cpu_percent > self.max_cpu_percent:
+            return False, f"CPU {cpu_percent:.0f}% > {self.max_cpu_percent}%"
+        return True, ""
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        ticket = object()
+        self._queue.append(ticket)
+        queued_at = time.monotonic()
+        try:
+            while True:
+                if self._queue[0] is ticket and self.active < self.max_concurrent:
+                    ok, _ = self.check_resources()
+                    # Quá max_wait mà không có launch nào đang chạy thì vẫn cho qua, tránh kẹt vĩnh viễn
+                    if ok or (self.active == 0 and time.monotonic() - queued_at >= self.max_wait_sec):
+                        break
+                await asyncio.sleep(self.poll_sec)
+        finally:
+            self._queue.remove(ticket)
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    def status_line(self) -> str:
+        return f"🚦 Launch queue: {self.queue_depth} chờ | {self.active}/{self.max_concurrent} đang launch"
+
 class GameLauncher:
     @staticmethod
     async def handle_game_launch(should_launch: bool, place_id: str, link_code: Optional[str], 
@@ -1109,57 +2232,637 @@ class GameLauncher:
             
             print(f"✅ [{package_name}] Launch process completed!")
 
-class RobloxUser:
-    def __init__(self, username: Optional[str] = None, user_id: Optional[int] = None, 
-                 cookie: Optional[str] = None):
-        self.username = username
-        self.user_id = user_id
-        self.cookie = cookie
+class RateLimiter:
+    """Token bucket dùng chung cho mọi request Roblox, tạm dừng theo Retry-After khi bị 429."""
+
+    def __init__(self, rate_per_sec: float = 5, burst: int = 10, max_wait_sec: float = 5):
+        self.rate_per_sec = max(0.01, float(rate_per_sec))
+        self.burst = max(1, int(burst))
+        self.max_wait_sec = max_wait_sec
+        self.tokens = float(self.burst)
+        self.paused_until = 0.0
+        self.throttled_count = 0
+        self.local_throttled_count = 0
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate_per_sec)
+        self._updated_at = now
+
+    async def acquire(self) -> bool:
+        # Không chờ quá max_wait_sec: chờ lâu thì báo throttled luôn để instance hẹn lại lần sau
+        deadline = time.monotonic() + self.max_wait_sec
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return True
 
-    async def fetch_authenticated_user(self) -> Optional[int]:
-        try:
-            headers = {
-                'Cookie': self.cookie,
-                'User-Agent': 'Mozilla/5.0 (Linux; Android 10; Termux)',
-                'Accept': 'application/json',
-            }
+            wait = max(self.paused_until - now, (1 - self.tokens) / self.rate_per_sec)
+            if now + wait > deadline:
+                self.local_throttled_count += 1
+                return False
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe(self, status: int, headers) -> None:
+        if status == 429:
+            self.throttled_count += 1
+            self.pause(RateLimiter.parse_retry_after(headers))
+            return
+
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        try:
+            if remaining is not None and reset is not None and float(remaining) <= 0:
+                self.pause(float(reset))
+        except ValueError:
+            pass
+
+    @staticmethod
+    def parse_retry_after(headers, default: float = 30) -> float:
+        value = headers.get('Retry-After') or headers.get('x-ratelimit-reset')
+        if not value:
+            return default
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
+
+    def status_line(self) -> str:
+        paused = max(0.0, self.paused_until - time.monotonic())
+        line = f"⛔ Throttled: {self.throttled_count} (429) | {self.local_throttled_count} (local)"
+        if paused > 0:
+            line += f" | tạm dừng {paused:.0f}s"
+        return line
+
+class ApiEndpoint:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    @property
+    def host(self) -> str:
+        return self.base_url.split('://', 1)[-1]
+
+    def score(self) -> float:
+        # Endpoint chưa thử có điểm 0 để được thử ít nhất một lần, chỉ toàn lỗi thì coi như rất chậm
+        if self.latency_ms is None:
+            return 0.0 if self.requests == 0 else 10000.0 * (1 + 5 * self.error_rate)
+        return self.latency_ms * (1 + 5 * self.error_rate)
+
+class EndpointPool:
+    """Chọn endpoint khỏe nhất của một API theo latency/tỉ lệ lỗi, mở circuit breaker khi lỗi liên tục."""
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, name: str, base_urls: List[str], failure_threshold: int = 3, cooldown_sec: float = 60):
+        self.name = name
+        self.endpoints = [ApiEndpoint(url) for url in base_urls]
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_sec = cooldown_sec
+
+    def ranked(self) -> List[ApiEndpoint]:
+        now = time.monotonic()
+        closed = sorted((e for e in self.endpoints if e.open_until <= now), key=ApiEndpoint.score)
+        # Tất cả đều đang mở circuit thì vẫn thử cái sắp hết cooldown nhất
+        opened = sorted((e for e in self.endpoints if e.open_until > now), key=lambda e: e.open_until)
+        return closed + opened
+
+    def record(self, endpoint: ApiEndpoint, ok: bool, latency_ms: float):
+        endpoint.requests += 1
+        endpoint.error_rate += self.EWMA_ALPHA * ((0.0 if ok else 1.0) - endpoint.error_rate)
+        if ok:
+            if endpoint.latency_ms is None:
+                endpoint.latency_ms = latency_ms
+            else:
+                endpoint.latency_ms += self.EWMA_ALPHA * (latency_ms - endpoint.latency_ms)
+            endpoint.consecutive_failures = 0
+            endpoint.open_until = 0.0
+            return
+
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            endpoint.open_until = time.monotonic() + self.cooldown_sec
+
+    def status_line(self) -> str:
+        now = time.monotonic()
+        parts = []
+        for endpoint in self.endpoints:
+            latency = f"{endpoint.latency_ms:.0f}ms" if endpoint.latency_ms is not None else "--"
+            if endpoint.open_until > now:
+                state = f"⛔ mở {endpoint.open_until - now:.0f}s"
+            else:
+                state = "✅"
+            parts.append(f"{endpoint.host} {latency} lỗi {endpoint.error_rate * 100:.0f}% {state}")
+        return f"🌐 {self.name}: " + " | ".join(parts)
+
+class HttpClient:
+    """Session aiohttp dùng chung (keep-alive + DNS cache) cho mọi API call của tool."""
+
+    def __init__(self, settings: Dict):
+        self.settings = settings
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.rate_limiter = RateLimiter(
+            settings['apiRatePerSec'], settings['apiBurst'], settings['rateLimitMaxWaitSec'])
+        self.pools = {
+            'presence': EndpointPool('presence', settings['presenceEndpoints'],
+                                     settings['circuitFailureThreshold'], settings['circuitCooldownSec']),
+            'users': EndpointPool('users', settings['usersEndpoints'],
+                                  settings['circuitFailureThreshold'], settings['circuitCooldownSec']),
+        }
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.settings['httpPoolSize'],
+                limit_per_host=self.settings['httpLimitPerHost'],
+                keepalive_timeout=self.settings['httpKeepAliveSec'],
+                use_dns_cache=True,
+                ttl_dns_cache=self.settings['httpDnsCacheSec'],
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.settings['httpTimeoutSec'],
+                connect=self.settings['httpConnectTimeoutSec'],
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Linux; Android 10; Termux)',
+                    'Accept': 'application/json',
+                },
+            )
+        return self._session
+
+    async def request_json(self, method: str, url: str, headers: Optional[Dict] = None,
+                           json_data=None) -> Tuple[int, Optional[Dict]]:
+        session = self.get_session()
+        async with session.request(method, url, headers=headers, json=json_data) as response:
+            self.rate_limiter.observe(response.status, response.headers)
+            data = None
+            if response.status == 200:
+                data = await response.json(content_type=None)
+            else:
+                await response.read()
+            return response.status, data
+
+    async def request_api(self, api: str, method: str, path: str, headers: Optional[Dict] = None,
+                          json_data=None) -> Tuple[int, Optional[Dict]]:
+        pool = self.pools[api]
+        last_error: Optional[Exception] = None
+        status = 0
+
+        # Thử endpoint tốt nhất, lỗi mạng/5xx thì chuyển sang endpoint kế tiếp một lần
+        for endpoint in pool.ranked()[:2]:
+            # Limiter chặn thì trả 429 cho caller như response thường, nhưng không tính vào metric của endpoint
+            if not await self.rate_limiter.acquire():
+                tool_metrics.record_local_throttle(api)
+                return 429, None
+
+            started = time.monotonic()
+            try:
+                status, data = await self.request_json(method, endpoint.base_url + path, headers, json_data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                pool.record(endpoint, False, (time.monotonic() - started) * 1000)
+                tool_metrics.observe_request(api, endpoint.base_url, "error", time.monotonic() - started)
+                last_error = e
+                continue
+
+            tool_metrics.observe_request(api, endpoint.base_url, str(status), time.monotonic() - started)
+
+            if status >= 500:
+                pool.record(endpoint, False, (time.monotonic() - started) * 1000)
+                continue
+            if status != 429:
+                pool.record(endpoint, True, (time.monotonic() - started) * 1000)
+            return status, data
+
+        if last_error is not None and status == 0:
+            raise last_error
+        return status, None
+
+    def endpoint_status_lines(self) -> List[str]:
+        return [pool.status_line() for pool in self.pools.values()]
+
+    async def warm_up(self):
+        # Mở sẵn kết nối TLS tới các host để lần check đầu không phải bắt tay lại
+        session = self.get_session()
+
+        async def touch(url: str):
+            try:
+                async with session.head(url, allow_redirects=False) as response:
+                    await response.read()
+            except Exception:
+                pass
+
+        urls = [endpoint.base_url + "/" for pool in self.pools.values() for endpoint in pool.endpoints]
+        await asyncio.gather(*(touch(url) for url in urls))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+class RobloxUser:
+    def __init__(self, username: Optional[str] = None, user_id: Optional[int] = None, 
+                 cookie: Optional[str] = None, http: Optional[HttpClient] = None):
+        self.username = username
+        self.user_id = user_id
+        self.cookie = cookie
+        self.http = http
+
+    async def fetch_authenticated_user(self) -> Optional[int]:
+        try:
+            headers = {'Cookie': self.cookie}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get("https://users.roblox.com/v1/users/authenticated", 
-                                     headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        self.username = data['name']
-                        self.user_id = data['id']
-                        print(f"✅ Lấy info thành công cho {self.username}!")
-                        return self.user_id
-                    else:
-                        print(f"❌ HTTP Error: {response.status}")
-                        return None
+            status, data = await self.http.request_api(
+                'users', "GET", "/v1/users/authenticated", headers=headers)
+            if status == 429:
+                print("⏳ Roblox API đang rate limit, thử lại sau!")
+                return None
+            if status == 200 and data:
+                self.username = data['name']
+                self.user_id = data['id']
+                print(f"✅ Lấy info thành công cho {self.username}!")
+                return self.user_id
+            else:
+                print(f"❌ HTTP Error: {status}")
+                return None
         except Exception as e:
             print(f"❌ Lỗi xác thực người dùng: {e}")
             return None
 
     async def get_presence(self) -> Optional[Dict]:
+        presences = await RobloxUser.fetch_presences(self.http, [self.user_id], self.cookie)
+        if not presences:
+            return None
+        return presences[0]
+
+    @staticmethod
+    async def fetch_presences(http: HttpClient, user_ids: List[int],
+                              cookie: Optional[str]) -> Optional[List[Dict]]:
         try:
-            headers = {
-                'Cookie': self.cookie,
-                'User-Agent': 'Mozilla/5.0 (Linux; Android 10; Termux)',
-                'Accept': 'application/json',
-            }
+            headers = {'Cookie': cookie or ''}
             
-            data = {'userIds': [self.user_id]}
+            data = {'userIds': user_ids}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post("https://presence.roproxy.com/v1/presence/users",
-                                      json=data, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get('userPresences', [{}])[0] if result.get('userPresences') else None
-                    return None
+            status, result = await http.request_api(
+                'presence', "POST", "/v1/presence/users", headers=headers, json_data=data)
+            if status == 429:
+                # Bị rate limit khác với offline: đánh dấu để không ai relaunch vì thiếu presence
+                return [{'userId': user_id, 'throttled': True} for user_id in user_ids]
+            if status == 200 and result:
+                return result.get('userPresences') or None
+            return None
         except:
             return None
 
+class PresenceBatcher:
+    """Gom presence của nhiều instance vào ít request nhất có thể."""
+
+    def __init__(self, http: HttpClient, batch_size: int = 50):
+        self.http = http
+        self.batch_size = max(1, int(batch_size))
+        self.last_user_count = 0
+        self.last_request_count = 0
+        self.total_requests = 0
+
+    async def fetch(self, users: List[RobloxUser],
+                    semaphore: Optional[asyncio.Semaphore] = None) -> Dict[int, Optional[Dict]]:
+        # Endpoint presence nhận list userIds, dùng cookie của user đầu tiên trong mỗi chunk
+        cookies = {}
+        for user in users:
+            if user.user_id and user.user_id not in cookies:
+                cookies[user.user_id] = user.cookie
+        user_ids = list(cookies)
+
+        results: Dict[int, Optional[Dict]] = {user_id: None for user_id in user_ids}
+        chunks = [user_ids[start:start + self.batch_size]
+                  for start in range(0, len(user_ids), self.batch_size)]
+        request_count = len(chunks)
+
+        async def fetch_chunk(chunk: List[int]):
+            if semaphore is None:
+                presences = await RobloxUser.fetch_presences(self.http, chunk, cookies[chunk[0]])
+            else:
+                async with semaphore:
+                    presences = await RobloxUser.fetch_presences(self.http, chunk, cookies[chunk[0]])
+
+            for presence in presences or []:
+                user_id = presence.get('userId')
+                if user_id in results:
+                    results[user_id] = presence
+
+        await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+
+        self.last_user_count = len(user_ids)
+        self.last_request_count = request_count
+        self.total_requests += request_count
+        return results
+
+    def stats_line(self) -> str:
+        return (f"📡 Presence: {self.last_user_count} users / {self.last_request_count} requests "
+                f"(batch {self.batch_size}, tổng {self.total_requests})")
+
+class CheckScheduler:
+    """Heap deadline check của từng instance, vòng lặp chỉ thức dậy khi có instance tới hạn."""
+
+    def __init__(self, jitter_sec: float = 0):
+        self.jitter_sec = max(0.0, float(jitter_sec))
+        self.wake_event = asyncio.Event()
+        self._heap: List[Tuple[float, int, 'InstanceState']] = []
+        self._sequence = 0
+
+    def schedule(self, instance: 'InstanceState', delay_sec: float, jitter: bool = True):
+        # Jitter để các instance cùng delay không check dồn một lúc
+        deadline = time.monotonic() + max(0.0, delay_sec)
+        if jitter:
+            deadline += random.uniform(0, self.jitter_sec)
+        instance.next_check_at = deadline
+        self._sequence += 1
+        heapq.heappush(self._heap, (deadline, self._sequence, instance))
+        self.wake_event.set()
+
+    def _drop_stale(self):
+        # Entry cũ còn trong heap khi instance đã được schedule lại
+        while self._heap and self._heap[0][2].next_check_at != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: float) -> List['InstanceState']:
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, instance = heapq.heappop(self._heap)
+            instance.next_check_at = None
+            due.append(instance)
+            self._drop_stale()
+        return due
+
+    def next_deadline(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    async def wait_until(self, deadline: float):
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(self.wake_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+class InstanceConfig:
+    """Config đã validate của một package trong multi_configs.json (key camelCase giữ nguyên trên đĩa)."""
+
+    __slots__ = ('package_name', 'username', 'user_id', 'place_id', 'game_name', 'link_code', 'delay_sec',
+                 'poll_min_sec', 'poll_max_sec', 'poll_backoff', 'adaptive_polling', 'session_key')
+
+    MIN_DELAY_SEC = 5
+
+    def __init__(self, package_name: str, username: str, user_id: int, place_id: str,
+                 game_name: str = "Unknown", link_code: Optional[str] = None, delay_sec: int = 30,
+                 poll_min_sec: Optional[float] = None, poll_max_sec: Optional[float] = None,
+                 poll_backoff: Optional[float] = None, adaptive_polling: Optional[bool] = None,
+                 session_key: Optional[str] = None):
+        self.package_name = package_name
+        self.username = username
+        self.user_id = user_id
+        self.place_id = place_id
+        self.game_name = game_name
+        self.link_code = link_code
+        self.delay_sec = delay_sec
+        self.poll_min_sec = poll_min_sec
+        self.poll_max_sec = poll_max_sec
+        self.poll_backoff = poll_backoff
+        self.adaptive_polling = adaptive_polling
+        self.session_key = session_key
+
+    @staticmethod
+    def from_dict(package_name: str, data) -> 'InstanceConfig':
+        if not isinstance(data, dict):
+            raise ValueError(f"{package_name}: config phải là object JSON")
+
+        def number(key: str, minimum: float, default=None, integer: bool = False):
+            value = data.get(key, default)
+            if value is None:
+                return None
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError(f"{package_name}: '{key}' phải là số (đang là {value!r})")
+            try:
+                value = int(value) if integer else float(value)
+            except ValueError:
+                raise ValueError(f"{package_name}: '{key}' phải là số (đang là {value!r})")
+            if value < minimum:
+                raise ValueError(f"{package_name}: '{key}' phải >= {minimum} (đang là {value!r})")
+            return value
+
+        username = data.get('username')
+        if not isinstance(username, str) or not username.strip():
+            raise ValueError(f"{package_name}: thiếu 'username'")
+
+        place_id = str(data.get('placeId') or '').strip()
+        if not place_id.isdigit():
+            raise ValueError(f"{package_name}: 'placeId' phải là dãy số (đang là {data.get('placeId')!r})")
+
+        link_code = data.get('linkCode')
+        if link_code is not None and not isinstance(link_code, str):
+            raise ValueError(f"{package_name}: 'linkCode' phải là chuỗi hoặc null")
+
+        adaptive_polling = data.get('adaptivePolling')
+        if adaptive_polling is not None and not isinstance(adaptive_polling, bool):
+            raise ValueError(f"{package_name}: 'adaptivePolling' phải là true/false")
+
+        config = InstanceConfig(
+            package_name=package_name,
+            username=username,
+            user_id=number('userId', 1, integer=True),
+            place_id=place_id,
+            game_name=str(data.get('gameName') or "Unknown"),
+            link_code=link_code or None,
+            delay_sec=number('delaySec', InstanceConfig.MIN_DELAY_SEC, 30, integer=True),
+            poll_min_sec=number('pollMinSec', InstanceConfig.MIN_DELAY_SEC),
+            poll_max_sec=number('pollMaxSec', InstanceConfig.MIN_DELAY_SEC),
+            poll_backoff=number('pollBackoff', 1),
+            adaptive_polling=adaptive_polling,
+            session_key=data.get('sessionKey') if isinstance(data.get('sessionKey'), str) else None,
+        )
+        if config.user_id is None:
+            raise ValueError(f"{package_name}: thiếu 'userId'")
+        if data.get('packageName', package_name) != package_name:
+            raise ValueError(f"{package_name}: 'packageName' không khớp key ({data.get('packageName')!r})")
+        poll_min = config.poll_min_sec if config.poll_min_sec is not None else config.delay_sec
+        if config.poll_max_sec is not None and config.poll_max_sec < poll_min:
+            raise ValueError(f"{package_name}: 'pollMaxSec' phải >= {poll_min}")
+        return config
+
+    def to_dict(self) -> Dict:
+        data = {
+            'username': self.username,
+            'userId': self.user_id,
+            'placeId': self.place_id,
+            'gameName': self.game_name,
+            'linkCode': self.link_code,
+            'delaySec': self.delay_sec,
+            'packageName': self.package_name,
+        }
+        optional = {
+            'pollMinSec': self.poll_min_sec,
+            'pollMaxSec': self.poll_max_sec,
+            'pollBackoff': self.poll_backoff,
+            'adaptivePolling': self.adaptive_polling,
+            'sessionKey': self.session_key,
+        }
+        data.update({key: value for key, value in optional.items() if value is not None})
+        return data
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, InstanceConfig) and self.to_dict() == other.to_dict()
+
+    @staticmethod
+    def parse_all(raw_configs) -> Dict[str, 'InstanceConfig']:
+        if not isinstance(raw_configs, dict):
+            raise ValueError("multi_configs.json phải là object {packageName: config}")
+        return {package_name: InstanceConfig.from_dict(package_name, data)
+                for package_name, data in raw_configs.items()}
+
+class InstanceState:
+    """Trạng thái runtime của một instance, slotted cho gọn vì có thể chạy vài chục clone."""
+
+    __slots__ = ('package_name', 'user', 'config', 'status_handler', 'status', 'info', 'countdown',
+                 'last_check', 'presence_type', 'countdown_seconds', 'poll_policy', 'poll_interval',
+                 'next_check_at', 'seen_alive', 'crash_detected', 'reported_status', 'first_check_sec')
+
+    def __init__(self, package_name: str, user: 'RobloxUser', config: InstanceConfig, poll_policy: 'PollPolicy'):
+        self.package_name = package_name
+        self.user = user
+        self.config = config
+        self.status_handler = StatusHandler()
+        self.status = "Khởi tạo... 🔄"
+        self.info = "Đang chuẩn bị..."
+        self.countdown = "00s"
+        self.last_check = 0
+        self.presence_type = "Unknown"
+        self.countdown_seconds = 0
+        self.poll_policy = poll_policy
+        self.poll_interval = poll_policy.min_sec
+        self.next_check_at: Optional[float] = None
+        self.seen_alive = False
+        self.crash_detected = False
+        self.reported_status: Optional[str] = None
+        self.first_check_sec: Optional[float] = None
+
+    def apply_config(self, config: InstanceConfig, settings: Dict) -> bool:
+        """Áp config mới mà không đụng tới app đang chạy; trả về True nếu chu kỳ check thay đổi."""
+        old_policy = self.poll_policy
+        self.config = config
+        self.user.username = config.username
+        self.user.user_id = config.user_id
+        self.poll_policy = PollPolicy.from_config(config, settings)
+
+        interval_changed = (self.poll_policy.min_sec, self.poll_policy.max_sec) != (old_policy.min_sec,
+                                                                                  old_policy.max_sec)
+        if interval_changed:
+            self.poll_interval = self.poll_policy.min_sec
+        return interval_changed
+
+class ConfigWatcher:
+    """Theo dõi mtime của multi_configs.json, chỉ trả config mới khi file đổi và validate thành công."""
+
+    def __init__(self, path: Path = CONFIG_PATH):
+        self.path = path
+        self.mtime = self.current_mtime()
+        self.last_error: Optional[str] = None
+
+    def current_mtime(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return None
+
+    def poll(self) -> Optional[Dict[str, InstanceConfig]]:
+        mtime = self.current_mtime()
+        if mtime is None or mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                configs = InstanceConfig.parse_all(json.load(f))
+        except (OSError, ValueError) as e:
+            # Sai ở đâu cũng bỏ cả file, tiếp tục chạy bằng config tốt gần nhất
+            self.last_error = str(e)
+            return None
+        self.last_error = None
+        return configs
+
+class PollPolicy:
+    """Giãn dần chu kỳ check khi instance ổn định, quay về delaySec ngay khi đổi trạng thái hoặc vừa launch."""
+
+    def __init__(self, min_sec: float, max_sec: float, backoff: float, enabled: bool = True):
+        self.min_sec = min_sec
+        self.max_sec = max(min_sec, max_sec)
+        self.backoff = max(1.0, backoff)
+        self.enabled = enabled
+
+    @staticmethod
+    def from_config(config: 'InstanceConfig', settings: Dict) -> 'PollPolicy':
+        # Mỗi package có thể ghi đè trong multi_configs.json: pollMinSec, pollMaxSec, pollBackoff, adaptivePolling
+        def pick(value, default):
+            return default if value is None else value
+
+        return PollPolicy(
+            pick(config.poll_min_sec, config.delay_sec),
+            pick(config.poll_max_sec, settings['pollMaxSec']),
+            pick(config.poll_backoff, settings['pollBackoffFactor']),
+            pick(config.adaptive_polling, settings['adaptivePolling']),
+        )
+
+    def next_interval(self, current: float, stable: bool) -> float:
+        if not self.enabled or not stable:
+            return self.min_sec
+        return min(self.max_sec, current * self.backoff)
+
+class ProcessProbe:
+    """Quét /proc một lần cho tất cả package để phát hiện clone bị crash mà không cần gọi API."""
+
+    @staticmethod
+    def scan(package_names: List[str]) -> set:
+        wanted = set(package_names)
+        alive = set()
+        try:
+            entries = os.scandir('/proc')
+        except OSError:
+            return alive
+
+        with entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                try:
+                    with open(f'/proc/{entry.name}/cmdline', 'rb') as f:
+                        cmdline = f.read(256)
+                except OSError:
+                    continue
+                # Process Android có cmdline là tên package, service phụ thì dạng package:service
+                process_name = cmdline.split(b'\0', 1)[0].decode('utf-8', errors='ignore')
+                package_name = process_name.split(':', 1)[0]
+                if package_name in wanted:
+                    alive.add(package_name)
+        return alive
+
 class GameSelector:
     def __init__(self):
         self.GAMES = {
@@ -1216,12 +2919,22 @@ class StatusHandler:
     def analyze_presence(self, presence: Optional[Dict], target_root_place_id: str) -> Dict:
         now = int(time.time() * 1000)
 
+        if presence and presence.get('throttled'):
+            return {
+                'status': "Throttled ⏳",
+                'info': "Roblox API đang rate limit, giữ nguyên app và check lại sau",
+                'shouldLaunch': False,
+                'rejoinOnly': False,
+                'throttled': True
+            }
+
         if not presence or presence.get('userPresenceType') is None:
             return {
                 'status': "Không rõ ❓",
                 'info': "Không lấy được trạng thái hoặc thiếu rootPlaceId",
                 'shouldLaunch': True,
-                'rejoinOnly': False
+                'rejoinOnly': False,
+                'reason': "unknown"
             }
 
         if presence.get('userPresenceType') in [0, 1]:
@@ -1229,7 +2942,8 @@ class StatusHandler:
                 'status': "Offline 💤",
                 'info': "User offline! Tiến hành rejoin! 🚀",
                 'shouldLaunch': True,
-                'rejoinOnly': False
+                'rejoinOnly': False,
+                'reason': "offline"
             }
 
         if presence.get('userPresenceType') != 2:
@@ -1237,7 +2951,8 @@ class StatusHandler:
                 'status': "Không online 🤔",
                 'info': "User không trong game. Đã mở lại game! 🎮",
                 'shouldLaunch': True,
-                'rejoinOnly': False
+                'rejoinOnly': False,
+                'reason': "not_in_game"
             }
 
         root_place_id = presence.get('rootPlaceId')
@@ -1246,7 +2961,8 @@ class StatusHandler:
                 'status': "Sai map rồi 🗺️",
                 'info': f"User đang trong game nhưng sai rootPlaceId ({root_place_id}). Đã rejoin đúng map! 🎯",
                 'shouldLaunch': True,
-                'rejoinOnly': True
+                'rejoinOnly': True,
+                'reason': "wrong_place"
             }
 
         return {
@@ -1256,19 +2972,35 @@ class StatusHandler:
             'rejoinOnly': False
         }
 
+    def crash_analysis(self) -> Dict:
+        return {
+            'status': "Crash 💥",
+            'info': "Process của app đã mất, relaunch ngay! 🚀",
+            'shouldLaunch': True,
+            'rejoinOnly': False,
+            'reason': "crash"
+        }
+
     def update_join_status(self, should_launch: bool):
         if should_launch:
             self.joined_at = int(time.time() * 1000)
             self.has_launched = True
 
 class UIRenderer:
+    _title_cache: Optional[str] = None
+
     @staticmethod
     def get_system_stats() -> Dict:
         try:
-            cpu_usage = psutil.cpu_percent(interval=0.1)
-            memory = psutil.virtual_memory()
-            total_gb = memory.total / (1024 ** 3)
-            used_gb = (memory.total - memory.available) / (1024 ** 3)
+            sample = metrics_sampler.latest()
+            if sample is None:
+                return {
+                    'cpuUsage': "N/A",
+                    'ramUsage': "N/A"
+                }
+            cpu_usage = sample['cpuPercent']
+            total_gb = sample['memoryTotal'] / (1024 ** 3)
+            used_gb = (sample['memoryTotal'] - sample['memoryAvailable']) / (1024 ** 3)
 
             return {
                 'cpuUsage': f"{cpu_usage:.1f}",
@@ -1283,6 +3015,13 @@ class UIRenderer:
 
     @staticmethod
     def render_title() -> str:
+        # figlet chỉ cần chạy một lần, title không đổi suốt phiên
+        if UIRenderer._title_cache is None:
+            UIRenderer._title_cache = UIRenderer._build_title()
+        return UIRenderer._title_cache
+
+    @staticmethod
+    def _build_title() -> str:
         fallback_title = """
 ╔═══════════════════════════════════════════════════════╗
 ║    🛒 𝗦𝗧𝗢𝗥𝗘𝟭𝗦.𝗖𝗢𝗠 • Premium E-Commerce Platform    ║
@@ -1313,56 +3052,109 @@ class UIRenderer:
         return f"{seconds // 60}m {seconds % 60}s" if seconds >= 60 else f"{seconds}s"
 
     @staticmethod
-    def render_multi_instance_table(instances: List[Dict]) -> str:
+    def format_delay(countdown_seconds: int, interval: Optional[float]) -> str:
+        # Countdown tới lần check kế tiếp / chu kỳ check hiện tại (adaptive)
+        if interval is None:
+            return UIRenderer.format_countdown(countdown_seconds)
+        return f"{UIRenderer.format_countdown(countdown_seconds)}/{int(interval)}s"
+
+    @staticmethod
+    def package_display(package_name: str) -> str:
+        if package_name == 'com.roblox.client':
+            return 'Global 🌍'
+        elif package_name == 'com.roblox.client.vnggames':
+            return 'VNG 🇻🇳'
+        elif package_name in ARYA_PACKAGES:
+            version = package_name[-1].upper()
+            return f'Arya {version} 🔥'
+        elif 'arya' in package_name.lower():
+            return 'Arya ⚡'
+        return package_name
+
+    @staticmethod
+    def mask_username(username: str) -> str:
+        return '*' * (len(username) - 3) + username[-3:] if len(username) > 3 else username
+
+    @staticmethod
+    def new_instance_table(no_wrap: bool = False) -> Table:
+        table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+        table.add_column("Package", style="dim", width=15, no_wrap=no_wrap)
+        table.add_column("User", width=8, no_wrap=no_wrap)
+        table.add_column("Status", width=12, no_wrap=no_wrap)
+        table.add_column("Info", width=25, no_wrap=no_wrap)
+        table.add_column("Time", width=8, no_wrap=no_wrap)
+        table.add_column("Delay", width=11, no_wrap=no_wrap)
+        return table
+
+    @staticmethod
+    def build_instance_row(instance: 'InstanceState', time_text: str) -> Tuple[str, ...]:
+        return (
+            UIRenderer.package_display(instance.package_name),
+            UIRenderer.mask_username(instance.config.username),
+            instance.status,
+            instance.info,
+            time_text,
+            UIRenderer.format_delay(instance.countdown_seconds, instance.poll_interval),
+        )
+
+    @staticmethod
+    def system_stats_line(instance_count: int, launch_queue_depth: Optional[int] = None) -> str:
+        stats = UIRenderer.get_system_stats()
+        line = f"💻 CPU: {stats['cpuUsage']}% | 🧠 RAM: {stats['ramUsage']} | 🔥 Instances: {instance_count}"
+        if launch_queue_depth is not None:
+            line += f" | 🚦 Queue: {launch_queue_depth}"
+        return line
+
+    @staticmethod
+    def render_multi_instance_table(instances: List['InstanceState'], launch_queue_depth: Optional[int] = None) -> str:
         try:
-            stats = UIRenderer.get_system_stats()
-            cpu_ram_line = f"💻 CPU: {stats['cpuUsage']}% | 🧠 RAM: {stats['ramUsage']} | 🔥 Instances: {len(instances)}"
+            cpu_ram_line = UIRenderer.system_stats_line(len(instances), launch_queue_depth)
 
-            table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
-            table.add_column("Package", style="dim", width=15)
-            table.add_column("User", width=8)
-            table.add_column("Status", width=12)
-            table.add_column("Info", width=25)
-            table.add_column("Time", width=8)
-            table.add_column("Delay", width=6)
+            table = UIRenderer.new_instance_table()
+            now_text = datetime.now().strftime("%H:%M:%S")
 
             for instance in instances:
-                package_name = instance.get('packageName', '')
-                if package_name == 'com.roblox.client':
-                    package_display = 'Global 🌍'
-                elif package_name == 'com.roblox.client.vnggames':
-                    package_display = 'VNG 🇻🇳'
-                elif package_name in ARYA_PACKAGES:
-                    version = package_name[-1].upper()
-                    package_display = f'Arya {version} 🔥'
-                elif 'arya' in package_name.lower():
-                    package_display = 'Arya ⚡'
-                else:
-                    package_display = package_name
+                table.add_row(*UIRenderer.build_instance_row(instance, now_text))
+
+            with console.capture() as capture:
+                console.print(cpu_ram_line)
+                console.print(table)
+            return capture.get()
 
-                raw_username = instance.get('config', {}).get('username', 'Unknown')
-                username = '*' * (len(raw_username) - 3) + raw_username[-3:] if len(raw_username) > 3 else raw_username
+        except Exception:
+            console.print("[red bold]❌ Lỗi trong render_multi_instance_table():[/red bold]")
+            traceback.print_exc()
+            return "[Lỗi render table]"
 
-                delay_seconds = instance.get('countdownSeconds', 0)
+    @staticmethod
+    def display_setup_packages(entries: List[Dict]) -> str:
+        try:
+            table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+            table.add_column("STT", width=5)
+            table.add_column("Package", width=20)
+            table.add_column("Username", width=15)
+            table.add_column("Game", width=20)
+            table.add_column("Delay", width=8)
+            table.add_column("Account", width=10)
 
+            for index, entry in enumerate(entries, start=1):
                 table.add_row(
-                    package_display,
-                    username,
-                    instance.get('status', 'Unknown'),
-                    instance.get('info', 'No info'),
-                    datetime.now().strftime("%H:%M:%S"),
-                    UIRenderer.format_countdown(delay_seconds)
+                    str(index),
+                    UIRenderer.package_display(entry['packageName']),
+                    UIRenderer.mask_username(entry['username']),
+                    entry.get('gameName') or "-",
+                    f"{entry['delaySec']}s" if entry.get('delaySec') else "-",
+                    entry['source'],
                 )
 
             with console.capture() as capture:
-                console.print(cpu_ram_line)
                 console.print(table)
             return capture.get()
 
         except Exception:
-            console.print("[red bold]❌ Lỗi trong render_multi_instance_table():[/red bold]")
+            console.print("[red bold]❌ Lỗi trong display_setup_packages():[/red bold]")
             traceback.print_exc()
-            return "[Lỗi render table]"
+            return "[Lỗi render setup table]"
 
     @staticmethod
     def display_configured_packages(configs: Dict) -> str:
@@ -1375,20 +3167,9 @@ class UIRenderer:
             table.add_column("Delay", width=8)
 
             for index, (package_name, config) in enumerate(configs.items(), start=1):
-                if package_name == 'com.roblox.client':
-                    package_display = 'Global 🌍'
-                elif package_name == 'com.roblox.client.vnggames':
-                    package_display = 'VNG 🇻🇳'
-                elif package_name in ARYA_PACKAGES:
-                    version = package_name[-1].upper()
-                    package_display = f'Arya {version} 🔥'
-                elif 'arya' in package_name.lower():
-                    package_display = 'Arya ⚡'
-                else:
-                    package_display = package_name
+                package_display = UIRenderer.package_display(package_name)
 
-                username = config.get('username', 'Unknown')
-                masked_username = '*' * (len(username) - 3) + username[-3:] if len(username) > 3 else username
+                masked_username = UIRenderer.mask_username(config.get('username', 'Unknown'))
 
                 table.add_row(
                     str(index),
@@ -1406,6 +3187,85 @@ class UIRenderer:
             console.print("[red bold]❌ Lỗi trong display_configured_packages():[/red bold]")
             traceback.print_exc()
             return "[Lỗi render config table]"
+class LiveDashboard:
+    """Dashboard bằng rich.live: title in một lần, row chỉ dựng lại khi đổi, giới hạn tốc độ refresh và chia trang."""
+
+    # Dòng header + viền/tiêu đề bảng + dòng trang
+    RESERVED_LINES = 7
+
+    def __init__(self, max_refresh_per_second: float = 2, page_sec: float = 5):
+        self.min_refresh_interval = 1 / max(0.1, max_refresh_per_second)
+        self.page_sec = page_sec
+        self.page = 0
+        self._live: Optional[Live] = None
+        self._rows: Dict[int, Tuple[Tuple, Tuple[str, ...]]] = {}
+        self._last_frame = None
+        self._last_refresh = 0.0
+        self._last_page_flip = 0.0
+
+    def start(self):
+        console.clear()
+        print(UIRenderer.render_title())
+        self._live = Live(console=console, auto_refresh=False, redirect_stdout=True, redirect_stderr=True)
+        self._live.start()
+        self._last_page_flip = time.monotonic()
+
+    def stop(self):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        self._rows.clear()
+        self._last_frame = None
+
+    def _row(self, instance: 'InstanceState') -> Tuple[str, ...]:
+        # Countdown đổi mỗi giây nên không nằm trong signature: chỉ thay ô Delay, các ô khác dùng lại từ cache
+        last_check = instance.last_check
+        signature = (
+            instance.package_name, instance.config.username,
+            instance.status, instance.info, last_check,
+        )
+        cached = self._rows.get(id(instance))
+        if cached is None or cached[0] != signature:
+            time_text = datetime.fromtimestamp(last_check / 1000).strftime("%H:%M:%S") if last_check else "--:--:--"
+            cached = (signature, UIRenderer.build_instance_row(instance, time_text)[:-1])
+            self._rows[id(instance)] = cached
+        return cached[1] + (UIRenderer.format_delay(instance.countdown_seconds, instance.poll_interval),)
+
+    def _page_size(self, footer_count: int = 0) -> int:
+        return max(1, console.size.height - UIRenderer.render_title().count("\n") - self.RESERVED_LINES - footer_count)
+
+    def update(self, instances: List['InstanceState'], header: str, footer_lines: List[str], now: float):
+        if self._live is None:
+            self.start()
+        if now - self._last_refresh < self.min_refresh_interval:
+            return
+
+        page_size = self._page_size(len(footer_lines))
+        page_count = max(1, (len(instances) + page_size - 1) // page_size)
+        if now - self._last_page_flip >= self.page_sec:
+            self.page = (self.page + 1) % page_count
+            self._last_page_flip = now
+        self.page = min(self.page, page_count - 1)
+
+        visible = instances[self.page * page_size:(self.page + 1) * page_size]
+        rows = tuple(self._row(instance) for instance in visible)
+        frame = (header, rows, tuple(footer_lines), self.page, page_count)
+        if frame == self._last_frame:
+            return
+
+        table = UIRenderer.new_instance_table(no_wrap=True)
+        for row in rows:
+            table.add_row(*row)
+
+        parts = [Text(header), table]
+        if page_count > 1:
+            parts.append(Text(f"📄 Trang {self.page + 1}/{page_count} ({len(instances)} instances)"))
+        parts.extend(Text(line) for line in footer_lines)
+
+        self._live.update(Group(*parts), refresh=True)
+        self._last_frame = frame
+        self._last_refresh = now
+
 def login_cookie():
                 try:
                     print("\033[95m=== Cookie Injection Menu ===\033[0m")
@@ -1476,17 +3336,7 @@ def login_cookie():
 
                     # ===== PACKAGE-SPECIFIC INJECTION =====
                     if pkg_choice == "1":
-                        result = os.popen("pm list packages").read().splitlines()
-                        keywords = [
-                            "roblox", "bduy", "mangcut", "concacug",
-                            "tencent", "ugpornkiki", "zam.nagy", "fynix.clone", "meow"
-                        ]
-
-                        pkgs = []
-                        for line in result:
-                            pkg = line.replace("package:", "").strip()
-                            if any(kw in pkg.lower() for kw in keywords):
-                                pkgs.append(pkg)
+                        pkgs = package_index.packages()
 
                         if not pkgs:
                             msg("No Roblox-related packages detected.", "err")
@@ -1564,15 +3414,71 @@ def login_cookie():
                     wait_back_menu()
 class MultiRejoinTool:
     def __init__(self):
-        self.instances = []
+        self.instances: List[InstanceState] = []
         self.is_running = False
-        self.webhook_manager = WebhookManager()
+        self.settings = Utils.load_tool_settings()
+        self.webhook_manager = WebhookManager(self.settings)
         self.android_id_manager = AndroidIDManager()
+        command_runner.configure(self.settings['maxConcurrentCommands'], self.settings['commandTimeoutSec'])
+        metrics_sampler.configure(self.settings['metricsSampleSec'], self.settings['metricsHistory'])
+        metrics_sampler.start()
+        event_log.configure(self.settings)
+        self.http = HttpClient(self.settings)
+        self.presence_batcher = PresenceBatcher(self.http, self.settings['presenceBatchSize'])
+        self.scheduler = CheckScheduler(self.settings['checkJitterSec'])
+        self.check_semaphore = asyncio.Semaphore(self.settings['maxConcurrentChecks'])
+        self.check_tasks = set()
+        self.config_path = CONFIG_PATH
+        self.config_watcher: Optional[ConfigWatcher] = None
+        self.config_status = "📝 Config: chưa theo dõi"
+        self.boot_status = "🚀 Boot: chờ check đầu tiên..."
+        self.webhook_task: Optional[asyncio.Task] = None
+        self.aggregator_task: Optional[asyncio.Task] = None
+        self.aggregator_client = None
+        if self.settings['aggregatorUrl']:
+            self.aggregator_client = AggregatorClient(self.settings)
+        self.live_dashboard = None
+        if self.settings['renderer'] == 'live':
+            self.live_dashboard = LiveDashboard(self.settings['liveMaxRefreshPerSecond'],
+                                                self.settings['livePageSec'])
+        self.launch_admission = LaunchAdmission(
+            self.settings['maxConcurrentLaunches'],
+            self.settings['launchMinFreeMemoryPercent'],
+            self.settings['launchMaxCpuPercent'],
+            self.settings['launchMaxWaitSec'],
+            self.settings['launchPollSec'],
+        )
+
+    MENU_ACTIONS = {
+        "1": "auto_rejoin",
+        "2": "setup",
+        "3": "webhook",
+        "4": "android_id",
+        "5": "logout",
+        "6": "login_cookie",
+        "0": "exit",
+    }
 
     async def start(self):
         Utils.ensure_root()
         Utils.enable_wake_lock()
+        await self.run_menu_loop()
+
+    async def run_menu_loop(self, state: str = "menu"):
+        """Dispatcher: mỗi màn hình trả về state kế tiếp thay vì gọi lại start(), nên stack không phình ra."""
+        handlers = {
+            "menu": self.show_menu,
+            "auto_rejoin": self.start_auto_rejoin,
+            "setup": self.setup_packages,
+            "webhook": self.open_webhook_setup,
+            "android_id": self.open_android_id_menu,
+            "logout": self.open_logout,
+            "login_cookie": self.open_login_cookie,
+        }
+        while state != "exit":
+            state = await handlers[state]() or "menu"
 
+    async def show_menu(self) -> str:
         os.system('clear' if os.name == 'posix' else 'cls')
         
         try:
@@ -1593,103 +3499,220 @@ class MultiRejoinTool:
         print("4. 📱 Auto Change Android ID")
         print("5.  ❌ Log Out Account")
         print("6.  🍪 Login Cookie")
+        print("0. 🚪 Thoát")
 
-        choice = Utils.ask("\nChọn option (1-4): ")
-
-        if choice.strip() == "1":
-            await self.start_auto_rejoin()
-        elif choice.strip() == "2":
-            await self.setup_packages()
-        elif choice.strip() == "3":
-            self.webhook_manager.setup_webhook()
-            input("\nNhấn Enter để tiếp tục...")
-            await self.start()
-        elif choice.strip() == "4":
-            self.android_id_manager.android_id_menu()
-            await self.start()
-        elif choice.strip() == "5":
-            logacc()
-        elif choice.strip() == "6":
-            login_cookie()
-           
-            
-        else:
+        choice = Utils.ask("\nChọn option (0-6): ")
+
+        action = self.MENU_ACTIONS.get(choice.strip())
+        if action is None:
             print("❌ Lựa chọn không hợp lệ!")
             await asyncio.sleep(1)
-            await self.start()
+            return "menu"
+        return action
 
-    async def setup_packages(self):
-        print("\n🔍 Đang quét tất cả packages Roblox và Arya...")
-        packages = Utils.detect_all_roblox_packages()
-        
-        if not packages:
-            print("❌ Không tìm thấy package nào!")
-            return
+    async def open_webhook_setup(self) -> str:
+        self.webhook_manager.setup_webhook()
+        input("\nNhấn Enter để tiếp tục...")
+        return "menu"
 
-        print("\n📦 Tìm thấy các packages:")
-        for index, pkg in enumerate(packages.values(), 1):
-            print(f"{index}. {pkg['displayName']} ({pkg['packageName']})")
+    async def open_android_id_menu(self) -> str:
+        self.android_id_manager.android_id_menu()
+        return "menu"
 
-        configs = Utils.load_multi_configs()
-        
-        for package_name, package_info in packages.items():
-            print(f"\n⚙️ Cấu hình cho {package_info['displayName']}")
-            
-            cookie = Utils.get_roblox_cookie(package_name)
+    async def open_logout(self) -> str:
+        logacc()
+        return "menu"
+
+    async def open_login_cookie(self) -> str:
+        login_cookie()
+        return "menu"
+
+    async def resolve_accounts(self, package_names: List[str], configs: Dict) -> List[Dict]:
+        """Đọc cookie và xác định account của mọi package cùng lúc, session đã biết thì dùng lại userId/username."""
+        cookies = await asyncio.gather(*(Utils.get_roblox_cookie(name) for name in package_names))
+
+        entries = []
+        pending = []
+        for package_name, cookie in zip(package_names, cookies):
             if not cookie:
                 print(f"❌ Không lấy được cookie cho {package_name}, bỏ qua...")
                 continue
 
-            user = RobloxUser(cookie=cookie)
-            user_id = await user.fetch_authenticated_user()
-            
+            config = configs.get(package_name) or {}
+            entry = {
+                'packageName': package_name,
+                'cookie': cookie,
+                'sessionKey': Utils.session_key(cookie),
+                'username': config.get('username'),
+                'userId': config.get('userId'),
+                'placeId': config.get('placeId'),
+                'gameName': config.get('gameName'),
+                'linkCode': config.get('linkCode'),
+                'delaySec': config.get('delaySec'),
+                'source': "cache",
+            }
+            # Chỉ hỏi API cho package mới hoặc đã đổi cookie (login account khác)
+            if config.get('sessionKey') != entry['sessionKey'] or not entry['userId'] or not entry['username']:
+                entry['source'] = "đổi session" if config else "mới"
+                pending.append(entry)
+            entries.append(entry)
+
+        async def identify(entry: Dict):
+            async with self.check_semaphore:
+                user = RobloxUser(cookie=entry['cookie'], http=self.http)
+                user_id = await user.fetch_authenticated_user()
             if not user_id:
-                print(f"❌ Không lấy được user info cho {package_name}, bỏ qua...")
+                entry['userId'] = None
+                return
+            if entry['userId'] and entry['userId'] != user_id:
+                entry['source'] = "đổi account"
+            entry['userId'] = user_id
+            entry['username'] = user.username
+
+        if pending:
+            print(f"\n🔎 Đang lấy thông tin {len(pending)} account mới ({len(entries) - len(pending)} dùng cache)...")
+            await asyncio.gather(*(identify(entry) for entry in pending))
+
+        resolved = []
+        for entry in entries:
+            if not entry['userId']:
+                print(f"❌ Không lấy được user info cho {entry['packageName']}, bỏ qua...")
                 continue
+            resolved.append(entry)
+        return resolved
 
-            print(f"👤 Username: {user.username}")
-            print(f"🆔 User ID: {user_id}")
+    @staticmethod
+    def ask_delay_sec() -> int:
+        while True:
+            try:
+                delay_input = Utils.ask("⏱️ Delay check (giây, 15-120): ")
+                delay_sec = int(delay_input)
+                if 15 <= delay_sec <= 120:
+                    return delay_sec
+                print("❌ Giá trị không hợp lệ! Vui lòng nhập lại.")
+            except ValueError:
+                print("❌ Giá trị không hợp lệ! Vui lòng nhập lại.")
+
+    async def assign_games(self, entries: List[Dict]):
+        """Gán game/delay theo nhóm: chọn nhiều package một lần thay vì hỏi từng package."""
+        while True:
+            print(UIRenderer.display_setup_packages(entries))
+            unassigned = [index for index, entry in enumerate(entries) if not entry['placeId']]
+            default_hint = f"{len(unassigned)} package chưa có game" if unassigned else "lưu và thoát"
+            choice = Utils.ask(
+                f"\n🎯 Chọn package để gán game/delay (Enter = {default_hint}, all = tất cả, "
+                "q = lưu và thoát, hoặc số cách nhau bởi khoảng trắng): "
+            ).strip().lower()
+
+            if choice == "q":
+                return
+            if choice == "":
+                if not unassigned:
+                    return
+                targets = unassigned
+            elif choice == "all":
+                targets = list(range(len(entries)))
+            else:
+                targets = [int(x) - 1 for x in choice.split() if x.isdigit() and 0 < int(x) <= len(entries)]
+                if not targets:
+                    print("❌ Lựa chọn không hợp lệ!")
+                    continue
 
-            selector = GameSelector()
-            game = await selector.choose_game()
+            try:
+                game = await GameSelector().choose_game()
+            except ValueError as e:
+                print(e)
+                continue
+            delay_sec = self.ask_delay_sec()
+
+            for index in targets:
+                entries[index].update(
+                    placeId=game['placeId'],
+                    gameName=game['name'],
+                    linkCode=game['linkCode'],
+                    delaySec=delay_sec,
+                )
+            print(f"✅ Đã gán {game['name']} / {delay_sec}s cho {len(targets)} package!")
 
-            while True:
-                try:
-                    delay_input = Utils.ask("⏱️ Delay check (giây, 15-120): ")
-                    delay_sec = int(delay_input)
-                    if 15 <= delay_sec <= 120:
-                        break
-                    print("❌ Giá trị không hợp lệ! Vui lòng nhập lại.")
-                except ValueError:
-                    print("❌ Giá trị không hợp lệ! Vui lòng nhập lại.")
-
-            configs[package_name] = {
-                'username': user.username,
-                'userId': user_id,
-                'placeId': game['placeId'],
-                'gameName': game['name'],
-                'linkCode': game['linkCode'],
-                'delaySec': delay_sec,
-                'packageName': package_name
-            }
+    async def setup_packages(self) -> str:
+        print("\n🔍 Đang quét tất cả packages Roblox và Arya...")
+        packages = await Utils.detect_all_roblox_packages()
+        
+        if not packages:
+            print("❌ Không tìm thấy package nào!")
+            await asyncio.sleep(2)
+            return "menu"
+
+        print("\n📦 Tìm thấy các packages:")
+        for index, pkg in enumerate(packages.values(), 1):
+            print(f"{index}. {pkg['displayName']} ({pkg['packageName']})")
 
-            print(f"✅ Đã cấu hình xong cho {package_info['displayName']}!")
+        configs = Utils.load_multi_configs()
+        entries = await self.resolve_accounts(list(packages), configs)
+        if not entries:
+            print("❌ Không có package nào lấy được account!")
+            await asyncio.sleep(2)
+            return "menu"
+
+        await self.assign_games(entries)
+
+        for entry in entries:
+            if not entry['placeId']:
+                print(f"⚠️ {entry['packageName']} chưa có game, không lưu config.")
+                continue
+            # Giữ nguyên các key khác (pollMinSec, pollBackoff...) của config cũ
+            configs.setdefault(entry['packageName'], {}).update({
+                'username': entry['username'],
+                'userId': entry['userId'],
+                'placeId': entry['placeId'],
+                'gameName': entry['gameName'],
+                'linkCode': entry['linkCode'],
+                'delaySec': entry['delaySec'],
+                'packageName': entry['packageName'],
+                'sessionKey': entry['sessionKey'],
+            })
 
         Utils.save_multi_configs(configs)
-        print("\n✅ Setup hoàn tất! Đã thêm tất cả các package Arya.")
+        print("\n✅ Setup hoàn tất!")
         
         print("\n⏳ Đang quay lại menu chính...")
         await asyncio.sleep(2)
-        await self.start()
+        return "menu"
 
-    async def start_auto_rejoin(self):
-        configs = Utils.load_multi_configs()
+    async def run_headless(self, packages: str, config_path: Path):
+        """Bỏ qua menu/title, đọc config và vào thẳng vòng monitor (dùng cho Termux:Boot)."""
+        Utils.ensure_root()
+        Utils.enable_wake_lock()
+
+        self.config_path = config_path
+        configs = Utils.load_multi_configs(config_path)
+        if not configs:
+            print(f"❌ Không có config nào trong {config_path}! Chạy setup packages trước.")
+            return
+
+        if packages.strip().lower() == "all":
+            selected_packages = list(configs)
+        else:
+            selected_packages = [name for name in re.split(r"[,\s]+", packages.strip()) if name]
+            missing = [name for name in selected_packages if name not in configs]
+            if missing:
+                print(f"⚠️ Không có config cho: {', '.join(missing)}")
+            selected_packages = [name for name in selected_packages if name in configs]
+
+        if not selected_packages:
+            print("❌ Không có package nào để chạy!")
+            return
+
+        print(f"🚀 Headless: chạy {len(selected_packages)} packages từ {config_path}")
+        await self.initialize_selected_instances(selected_packages, configs, headless=True)
+
+    async def start_auto_rejoin(self) -> str:
+        configs = Utils.load_multi_configs(self.config_path)
 
         if not configs:
             print("❌ Chưa có config nào! Vui lòng chạy setup packages trước.")
             await asyncio.sleep(2)
-            await self.start()
-            return
+            return "menu"
 
         print("\n📋 Danh sách packages đã cấu hình:")
         print(UIRenderer.display_configured_packages(configs))
@@ -1699,17 +3722,7 @@ class MultiRejoinTool:
 
         package_list = []
         for index, (package_name, config) in enumerate(configs.items(), start=1):
-            if package_name == 'com.roblox.client':
-                package_display = 'Global 🌍'
-            elif package_name == 'com.roblox.client.vnggames':
-                package_display = 'VNG 🇻🇳'
-            elif package_name in ARYA_PACKAGES:
-                version = package_name[-1].upper()
-                package_display = f'Arya {version} 🔥'
-            elif 'arya' in package_name.lower():
-                package_display = 'Arya ⚡'
-            else:
-                package_display = package_name
+            package_display = UIRenderer.package_display(package_name)
 
             print(f"{index}. {package_display} ({config['username']})")
             package_list.append(package_name)
@@ -1727,8 +3740,7 @@ class MultiRejoinTool:
                 if not indices:
                     print("❌ Lựa chọn không hợp lệ!")
                     await asyncio.sleep(1)
-                    await self.start_auto_rejoin()
-                    return
+                    return "auto_rejoin"
 
                 selected_packages = [package_list[i] for i in indices]
                 print("🎯 Sẽ chạy các packages:")
@@ -1737,106 +3749,369 @@ class MultiRejoinTool:
             except (ValueError, IndexError):
                 print("❌ Lựa chọn không hợp lệ!")
                 await asyncio.sleep(1)
-                await self.start_auto_rejoin()
-                return
+                return "auto_rejoin"
 
         print("\n🚀 Khởi tạo multi-instance rejoin...")
         await self.initialize_selected_instances(selected_packages, configs)
-
-    async def initialize_selected_instances(self, selected_packages: List[str], configs: Dict):
+        # Dừng monitor xong thì bỏ hết state của lượt này trước khi về menu
+        self.reset_monitoring_state()
+        return "menu"
+
+    def create_instance(self, package_name: str, config: InstanceConfig, cookie: str) -> InstanceState:
+        user = RobloxUser(config.username, config.user_id, cookie, self.http)
+        return InstanceState(package_name, user, config, PollPolicy.from_config(config, self.settings))
+
+    async def initialize_selected_instances(self, selected_packages: List[str], configs: Dict,
+                                            headless: bool = False):
+        self.reset_monitoring_state()
+        valid_configs = []
         for package_name in selected_packages:
-            config = configs[package_name]
-            cookie = Utils.get_roblox_cookie(package_name)
-            
+            try:
+                valid_configs.append(InstanceConfig.from_dict(package_name, configs[package_name]))
+            except ValueError as e:
+                print(f"❌ Config không hợp lệ, bỏ qua: {e}")
+
+        # Đọc cookie của các package song song, không phải chờ lần lượt từng cái
+        cookies = await asyncio.gather(*(Utils.get_roblox_cookie(config.package_name) for config in valid_configs))
+        for config, cookie in zip(valid_configs, cookies):
             if not cookie:
-                print(f"❌ Không lấy được cookie cho {package_name}, bỏ qua...")
+                print(f"❌ Không lấy được cookie cho {config.package_name}, bỏ qua...")
                 continue
 
-            user = RobloxUser(config['username'], config['userId'], cookie)
-            status_handler = StatusHandler()
-
-            self.instances.append({
-                'packageName': package_name,
-                'user': user,
-                'config': config,
-                'statusHandler': status_handler,
-                'status': "Khởi tạo... 🔄",
-                'info': "Đang chuẩn bị...",
-                'countdown': "00s",
-                'lastCheck': 0,
-                'presenceType': "Unknown",
-                'countdownSeconds': 0
-            })
+            self.instances.append(self.create_instance(config.package_name, config, cookie))
 
         if not self.instances:
             print("❌ Không có instance nào khả dụng!")
             return
 
         print(f"✅ Đã khởi tạo {len(self.instances)} instances!")
-        print("⏳ Bắt đầu auto rejoin trong 3 giây...")
-        await asyncio.sleep(3)
+        if headless:
+            # Headless vào monitor ngay, warm-up chạy nền song song với lượt check đầu
+            if self.settings['httpWarmUp']:
+                self.spawn_check_task(self.http.warm_up())
+        else:
+            start_delay = self.settings['startDelaySec']
+            print(f"⏳ Bắt đầu auto rejoin trong {start_delay} giây...")
+            if self.settings['httpWarmUp']:
+                await asyncio.gather(self.http.warm_up(), asyncio.sleep(start_delay))
+            else:
+                await asyncio.sleep(start_delay)
         
         self.is_running = True
         await self.run_multi_instance_loop()
 
-    async def run_multi_instance_loop(self):
-        render_counter = 0
-        webhook_counter = 0
-
-        while self.is_running:
-            now = int(time.time() * 1000)
-
-            for instance in self.instances:
-                config = instance['config']
-                user = instance['user']
-                status_handler = instance['statusHandler']
-                delay_ms = config['delaySec'] * 1000
+    def stop_monitoring(self):
+        self.is_running = False
+        self.scheduler.wake_event.set()
 
-                time_since_last_check = now - instance['lastCheck']
+    def reset_monitoring_state(self):
+        # Mỗi lượt monitor bắt đầu sạch: không giữ instance, heap deadline hay task của lượt trước
+        self.is_running = False
+        self.instances = []
+        self.scheduler = CheckScheduler(self.settings['checkJitterSec'])
+        self.check_tasks = set()
+        self.config_watcher = None
+        self.config_status = "📝 Config: chưa theo dõi"
+        self.boot_status = "🚀 Boot: chờ check đầu tiên..."
+        tool_metrics.get_instances = lambda: []
 
-                time_left = max(0, delay_ms - time_since_last_check)
-                instance['countdownSeconds'] = int((time_left + 999) // 1000)
+    async def run_multi_instance_loop(self):
+        # Check đầu tiên chạy ngay, không jitter vì presence của cả lượt đầu đã đi chung batch;
+        # sau đó mỗi instance tự hẹn giờ theo delaySec
+        for instance in self.instances:
+            self.scheduler.schedule(instance, 0, jitter=False)
+
+        next_render = time.monotonic()
+        next_probe = next_render + self.settings['crashProbeSec']
+        next_reload = next_render + self.settings['configReloadSec']
+        self.config_watcher = ConfigWatcher(self.config_path)
+        self.config_status = f"📝 Config: đang theo dõi {self.config_path.name}"
+
+        # Có aggregator thì chỉ aggregator gửi webhook gộp, thiết bị không tự gửi report/ảnh riêng nữa
+        self.webhook_task = None
+        self.aggregator_task = None
+        if self.aggregator_client is None:
+            self.webhook_task = asyncio.create_task(
+                self.webhook_manager.run_worker(
+                    self.http, lambda: self.webhook_manager.build_snapshot(self.instances), self.settings))
+        else:
+            self.aggregator_task = asyncio.create_task(
+                self.aggregator_client.run(self.http, lambda: self.aggregator_client.build_snapshot(
+                    self.webhook_manager, self.instances)))
+
+        tool_metrics.get_instances = lambda: self.instances
+        loop_lag_task = asyncio.create_task(tool_metrics.monitor_loop_lag(self.settings['loopLagSampleSec']))
+        event_log_task = asyncio.create_task(event_log.run_flusher(self.settings['eventLogFlushSec']))
+        if self.settings['metricsPort']:
+            try:
+                await tool_metrics.start_server(self.settings['metricsHost'], int(self.settings['metricsPort']))
+            except OSError as e:
+                print(f"⚠️ Không mở được metrics endpoint: {e}")
 
-                if time_since_last_check >= delay_ms:
-                    presence = await user.get_presence()
+        # Ctrl+C trong lúc monitor chỉ dừng monitor (về menu), không thoát hẳn tool
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.stop_monitoring)
+        except (NotImplementedError, RuntimeError):
+            pass
 
-                    presence_type_display = "Unknown"
-                    if presence and 'userPresenceType' in presence:
-                        presence_type_display = str(presence['userPresenceType'])
+        try:
+            while self.is_running:
+                self.scheduler.wake_event.clear()
+                now = time.monotonic()
+
+                # Gom luôn các instance sắp tới hạn để presence vẫn đi chung một batch
+                due_instances = self.scheduler.pop_due(now + self.settings['checkBatchWindowSec'])
+                if due_instances:
+                    self.spawn_check_task(self.run_due_checks(due_instances))
+
+                if now >= next_render:
+                    self.render_dashboard(now)
+                    next_render = now + self.render_interval()
+
+                if self.settings['crashProbeEnabled'] and now >= next_probe:
+                    self.spawn_check_task(self.run_crash_probe())
+                    next_probe = now + self.settings['crashProbeSec']
+
+                if now >= next_reload:
+                    self.spawn_check_task(self.reload_configs())
+                    next_reload = now + self.settings['configReloadSec']
+
+                wake_at = min(next_render, next_reload)
+                if self.settings['crashProbeEnabled']:
+                    wake_at = min(wake_at, next_probe)
+                next_deadline = self.scheduler.next_deadline()
+                if next_deadline is not None:
+                    wake_at = min(wake_at, next_deadline)
+                await self.scheduler.wait_until(wake_at)
+        finally:
+            background_tasks = [loop_lag_task, *self.check_tasks]
+            for task in (self.webhook_task, self.aggregator_task):
+                if task is not None:
+                    background_tasks.append(task)
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            # Flusher dừng sau cùng để nhận cả event của các check vừa bị huỷ
+            event_log_task.cancel()
+            await asyncio.gather(event_log_task, return_exceptions=True)
+            self.webhook_task = None
+            self.aggregator_task = None
+            await tool_metrics.stop_server()
+            if self.live_dashboard is not None:
+                self.live_dashboard.stop()
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+                signal.signal(signal.SIGINT, signal_handler)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def render_interval(self) -> float:
+        if self.live_dashboard is not None:
+            return self.settings['liveRenderIntervalSec']
+        return self.settings['renderIntervalSec']
+
+    def spawn_check_task(self, coro):
+        task = asyncio.create_task(coro)
+        self.check_tasks.add(task)
+        task.add_done_callback(self.check_tasks.discard)
+        return task
+
+    async def run_crash_probe(self):
+        package_names = [instance.package_name for instance in self.instances]
+        alive = await asyncio.to_thread(ProcessProbe.scan, package_names)
+
+        for instance in self.instances:
+            if instance.package_name in alive:
+                instance.seen_alive = True
+                continue
+            # Chỉ coi là crash khi đã từng thấy process sống (tránh báo nhầm lúc app đang mở
+            # hoặc khi không đọc được /proc) và instance không đang check/launch dở
+            if instance.seen_alive and instance.next_check_at is not None:
+                instance.seen_alive = False
+                instance.crash_detected = True
+                instance.status = "Crash 💥"
+                instance.info = "Không thấy process, chuẩn bị relaunch..."
+                self.scheduler.schedule(instance, 0, jitter=False)
+
+    async def reload_configs(self):
+        configs = await asyncio.to_thread(self.config_watcher.poll)
+        if configs is None:
+            if self.config_watcher.last_error:
+                self.config_status = f"⚠️ Config lỗi, giữ config cũ: {self.config_watcher.last_error}"
+            return
 
-                    analysis = status_handler.analyze_presence(presence, config['placeId'])
+        applied = []
+        for instance in self.instances:
+            config = configs.get(instance.package_name)
+            # Package bị xoá khỏi file vẫn chạy tiếp bằng config cũ tới lần khởi động sau
+            if config is None or config == instance.config:
+                continue
+            if instance.apply_config(config, self.settings) and instance.next_check_at is not None:
+                self.scheduler.schedule(instance, instance.poll_interval)
+            instance.info = "Đã áp dụng config mới ♻️"
+            applied.append(instance.package_name)
+
+        self.config_status = (f"📝 Config: reload lúc {datetime.now().strftime('%H:%M:%S')}, "
+                              f"cập nhật {len(applied)} instance")
+        event_log.emit('config_reload', packages=applied)
+
+    async def run_due_checks(self, due_instances: List[InstanceState]):
+        # Instance đã bị probe báo crash thì relaunch luôn, khỏi tốn request presence
+        presence_users = [instance.user for instance in due_instances if not instance.crash_detected]
+        try:
+            presences = await self.presence_batcher.fetch(presence_users, self.check_semaphore)
+        except Exception as e:
+            print(f"❌ Lỗi lấy presence: {e}")
+            presences = {}
 
-                    if analysis['shouldLaunch']:
-                        await GameLauncher.handle_game_launch(
-                            analysis['shouldLaunch'],
-                            config['placeId'],
-                            config['linkCode'],
-                            config['packageName'],
-                            analysis['rejoinOnly']
-                        )
-                        status_handler.update_join_status(analysis['shouldLaunch'])
+        await asyncio.gather(*(
+            self.process_check(instance, presences.get(instance.user.user_id))
+            for instance in due_instances
+        ))
 
-                    instance['status'] = analysis['status']
-                    instance['info'] = analysis['info']
-                    instance['presenceType'] = presence_type_display
-                    instance['lastCheck'] = now
+    async def process_check(self, instance: InstanceState, presence: Optional[Dict]):
+        config = instance.config
+        status_handler = instance.status_handler
+        started = time.monotonic()
 
-                if not instance.get('presenceType'):
-                    instance['presenceType'] = "Unknown"
+        try:
+            presence_type_display = "Unknown"
+            if presence and 'userPresenceType' in presence:
+                presence_type_display = str(presence['userPresenceType'])
 
-            if webhook_counter >= 30:
-                asyncio.create_task(self.send_webhook_async())
-                webhook_counter = 0
+            if instance.crash_detected:
+                instance.crash_detected = False
+                analysis = status_handler.crash_analysis()
             else:
-                webhook_counter += 1
+                analysis = status_handler.analyze_presence(presence, config.place_id)
+
+            if presence and presence.get('userPresenceType') is not None:
+                tool_metrics.record_success(instance.package_name)
+
+            if not analysis.get('throttled'):
+                # So với status thật lần trước (reported_status), status "Throttled" chỉ để hiển thị
+                stable = not analysis['shouldLaunch'] and instance.reported_status == analysis['status']
+                instance.poll_interval = instance.poll_policy.next_interval(instance.poll_interval, stable)
+
+            if analysis['shouldLaunch']:
+                instance.seen_alive = False
+                tool_metrics.record_relaunch(instance.package_name, analysis.get('reason', "unknown"))
+                await self.launch_instance(instance, analysis)
+                status_handler.update_join_status(analysis['shouldLaunch'])
+
+            if not analysis.get('throttled'):
+                reported_status = instance.reported_status
+                if (reported_status is not None and reported_status != analysis['status']
+                        and self.aggregator_client is None):
+                    self.webhook_manager.notify_change(instance, reported_status, analysis['status'])
+                instance.reported_status = analysis['status']
+
+            instance.status = analysis['status']
+            instance.info = analysis['info']
+            instance.presence_type = presence_type_display
+            instance.last_check = int(time.time() * 1000)
+            if instance.first_check_sec is None:
+                self.record_first_check(instance)
+
+            if analysis.get('throttled'):
+                action = "throttled"
+            elif analysis['shouldLaunch']:
+                action = "rejoin" if analysis['rejoinOnly'] else "launch"
+            else:
+                action = "none"
+            event_log.emit(
+                'check',
+                package=instance.package_name,
+                user=instance.user.username or instance.user.user_id,
+                status=analysis['status'],
+                online=not analysis['shouldLaunch'] and not analysis.get('throttled'),
+                presenceType=presence.get('userPresenceType') if presence else None,
+                rootPlaceId=presence.get('rootPlaceId') if presence else None,
+                action=action,
+                reason=analysis.get('reason'),
+                durationMs=round((time.monotonic() - started) * 1000),
+            )
+        except Exception as e:
+            instance.info = f"Lỗi check: {e}"
+            event_log.emit('check_error', package=instance.package_name, error=str(e))
+        finally:
+            if self.is_running:
+                self.scheduler.schedule(instance, instance.poll_interval)
+
+    def record_first_check(self, instance: InstanceState):
+        instance.first_check_sec = time.time() - PROCESS_STARTED_AT
+        event_log.emit('first_check', package=instance.package_name,
+                       sinceStartSec=round(instance.first_check_sec, 3))
+
+        done = [item.first_check_sec for item in self.instances if item.first_check_sec is not None]
+        self.boot_status = (f"🚀 Boot → check đầu tiên: {min(done):.1f}s - {max(done):.1f}s "
+                            f"({len(done)}/{len(self.instances)} instances)")
+        if len(done) == len(self.instances):
+            event_log.emit('boot_ready', instances=len(done), sinceStartSec=round(max(done), 3))
+
+    async def launch_instance(self, instance: InstanceState, analysis: Dict):
+        config = instance.config
+
+        # Rejoin không kill app nên nhẹ, chỉ cold start mới phải xếp hàng chờ tài nguyên
+        if analysis['rejoinOnly']:
+            gate = self.check_semaphore
+        else:
+            instance.status = "Chờ launch 🚦"
+            instance.info = f"Đang chờ tài nguyên ({self.launch_admission.queue_depth + 1} trong hàng đợi)"
+            gate = self.launch_admission.slot()
+
+        queued_at = time.monotonic()
+        ok = False
+        async with gate:
+            started = time.monotonic()
+            try:
+                await GameLauncher.handle_game_launch(
+                    analysis['shouldLaunch'],
+                    config.place_id,
+                    config.link_code,
+                    config.package_name,
+                    analysis['rejoinOnly']
+                )
+                ok = True
+            finally:
+                event_log.emit(
+                    'launch',
+                    package=instance.package_name,
+                    user=instance.user.username or instance.user.user_id,
+                    mode="rejoin" if analysis['rejoinOnly'] else "cold",
+                    reason=analysis.get('reason', "unknown"),
+                    waitMs=round((started - queued_at) * 1000),
+                    durationMs=round((time.monotonic() - started) * 1000),
+                    ok=ok,
+                )
 
-            if render_counter % 5 == 0:
-                os.system('clear' if os.name == 'posix' else 'cls')
-                
-                try:
-                    print(UIRenderer.render_title())
-                except:
-                    print("""
+    def render_dashboard(self, now: float):
+        for instance in self.instances:
+            next_check_at = instance.next_check_at
+            time_left = max(0.0, next_check_at - now) if next_check_at else 0.0
+            instance.countdown_seconds = int(time_left + 0.999)
+
+        if self.live_dashboard is not None:
+            header = UIRenderer.system_stats_line(len(self.instances), self.launch_admission.queue_depth)
+            footer_lines = [
+                self.presence_batcher.stats_line(),
+                self.launch_admission.status_line(),
+                self.http.rate_limiter.status_line(),
+                *self.http.endpoint_status_lines(),
+                self.config_status,
+                self.boot_status,
+                "💡 Nhấn Ctrl+C để dừng monitor",
+            ]
+            self.live_dashboard.update(self.instances, header, footer_lines, now)
+            return
+
+        os.system('clear' if os.name == 'posix' else 'cls')
+        
+        try:
+            print(UIRenderer.render_title())
+        except:
+            print("""
 ╔═══════════════════════════════════════════════════════╗
 ║    🛒 𝗦𝗧𝗢𝗥𝗘𝟭𝗦.𝗖𝗢𝗠 • Premium E-Commerce Platform    ║
 ║         Your Trusted Shopping Destination            ║
@@ -1844,22 +4119,283 @@ class MultiRejoinTool:
 ║           © 2024 STORE1S.COM • All Rights Reserved   ║
 ╚═══════════════════════════════════════════════════════╝""")
 
-                print(UIRenderer.render_multi_instance_table(self.instances))
+        print(UIRenderer.render_multi_instance_table(self.instances, self.launch_admission.queue_depth))
+        print(self.presence_batcher.stats_line())
+        print(self.launch_admission.status_line())
+        print(self.http.rate_limiter.status_line())
+        for line in self.http.endpoint_status_lines():
+            print(line)
+        print(self.config_status)
+        print(self.boot_status)
+
+        if self.instances:
+            print("\n🔍 Debug (Instance 1):")
+            print(f"Package: {self.instances[0].package_name}")
+            print(f"Last Check: {datetime.fromtimestamp(self.instances[0].last_check/1000).strftime('%H:%M:%S')}")
+
+        print("\n💡 Nhấn Ctrl+C để dừng monitor")
+
+class AggregatorClient:
+    """Đẩy snapshot gọn lên fleet aggregator; aggregator chết thì chỉ giữ snapshot mới nhất để gửi lại sau."""
+
+    def __init__(self, settings: Dict):
+        self.url = settings['aggregatorUrl'].rstrip('/') + "/snapshots"
+        self.device_name = settings['aggregatorDeviceName']
+        self.snapshot_sec = settings['aggregatorSnapshotSec']
+        self.push_sec = settings['aggregatorPushSec']
+        self.timeout_sec = settings['aggregatorTimeoutSec']
+        self.headers = {}
+        if settings['aggregatorToken']:
+            self.headers['Authorization'] = f"Bearer {settings['aggregatorToken']}"
+        # Aggregator chỉ giữ snapshot mới nhất của mỗi thiết bị nên không cần xếp hàng snapshot cũ
+        self.pending: Optional[Dict] = None
+        self.failures = 0
+
+    def build_snapshot(self, webhook_manager: WebhookManager, instances: List[InstanceState]) -> Optional[Dict]:
+        snapshot = webhook_manager.build_snapshot(instances)
+        if snapshot is None:
+            return None
+        sample = metrics_sampler.latest() or {}
+        snapshot.update(
+            device=self.device_name or webhook_manager.device_name or socket.gethostname(),
+            sentAt=time.time(),
+            metrics={key: sample.get(key) for key in ('cpuPercent', 'memoryUsed', 'memoryTotal',
+                                                      'diskUsed', 'diskTotal')},
+        )
+        return snapshot
+
+    async def flush(self, http: HttpClient) -> bool:
+        snapshot = self.pending
+        if snapshot is None:
+            return True
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.timeout_sec)
+            async with http.get_session().post(self.url, json={'snapshots': [snapshot]},
+                                              headers=self.headers, timeout=timeout) as response:
+                await response.read()
+                ok = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+
+        if ok:
+            if self.pending is snapshot:
+                self.pending = None
+            self.failures = 0
+        else:
+            self.failures += 1
+        return ok
 
-                if self.instances:
-                    print("\n🔍 Debug (Instance 1):")
-                    print(f"Package: {self.instances[0]['packageName']}")
-                    print(f"Last Check: {datetime.fromtimestamp(self.instances[0]['lastCheck']/1000).strftime('%H:%M:%S')}")
+    async def run(self, http: HttpClient, get_snapshot):
+        next_push = time.monotonic() + self.push_sec
+        while True:
+            snapshot = get_snapshot()
+            if snapshot:
+                self.pending = snapshot
+
+            if time.monotonic() >= next_push:
+                await self.flush(http)
+                # Aggregator không phản hồi thì giãn dần chu kỳ push, tối đa 8 lần
+                next_push = time.monotonic() + self.push_sec * min(8, 2 ** self.failures)
+
+            await asyncio.sleep(self.snapshot_sec)
+
+class FleetAggregator:
+    """Service HTTP nhỏ nhận snapshot từ nhiều thiết bị, hiển thị một fleet view và gửi một webhook chung."""
+
+    MAX_DEVICES = 500
+
+    def __init__(self, settings: Dict, host: str, port: int, webhook_url: Optional[str] = None,
+                 interval_min: int = 60, stale_sec: float = 180, evict_sec: float = 3600,
+                 token: Optional[str] = None):
+        self.settings = settings
+        self.host = host
+        self.port = port
+        self.stale_sec = stale_sec
+        self.evict_sec = max(stale_sec, evict_sec)
+        self.token = token
+        self.devices: Dict[str, Dict] = {}
+        self.http = HttpClient(settings)
+        self.webhook: Optional[WebhookManager] = None
+        if webhook_url:
+            self.webhook = WebhookManager(settings)
+            self.webhook.outbox = WebhookOutbox(AGGREGATOR_OUTBOX_PATH)
+            self.webhook.webhook_url = webhook_url
+            self.webhook.device_name = "Fleet"
+            self.webhook.interval = interval_min
+            self.webhook.mode = 'periodic'
+            self.webhook.enabled = True
+            self.webhook.attach_screenshot = False
+
+    def authorized(self, request: web.Request) -> bool:
+        if not self.token:
+            return True
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {self.token}")
+
+    def evict_stale(self):
+        # Thiết bị im lặng quá lâu thì bỏ hẳn, giữa stale_sec và evict_sec vẫn hiện ⚠️ trên fleet view
+        now = time.time()
+        for device in [name for name, snapshot in self.devices.items()
+                       if now - snapshot['receivedAt'] > self.evict_sec]:
+            del self.devices[device]
+
+    async def handle_snapshots(self, request: web.Request) -> web.Response:
+        if not self.authorized(request):
+            return web.json_response({'ok': False, 'error': 'unauthorized'}, status=401)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({'ok': False, 'error': 'invalid json'}, status=400)
+
+        snapshots = payload.get('snapshots') if isinstance(payload, dict) else None
+        if not isinstance(snapshots, list) or not all(isinstance(item, dict) for item in snapshots):
+            return web.json_response({'ok': False, 'error': 'snapshots must be a list of objects'}, status=400)
+
+        # Kiểm tra cả batch trước khi ghi: hoặc nhận hết, hoặc từ chối hết để client gửi lại nguyên batch
+        for snapshot in snapshots:
+            error = self.validate_snapshot(snapshot)
+            if error:
+                return web.json_response({'ok': False, 'error': error}, status=400)
+
+        self.evict_stale()
+        devices = {str(snapshot.get('device') or request.remote) for snapshot in snapshots}
+        if len(self.devices) + len(devices - self.devices.keys()) > self.MAX_DEVICES:
+            return web.json_response({'ok': False, 'error': 'too many devices'}, status=503)
+
+        for snapshot in snapshots:
+            device = str(snapshot.get('device') or request.remote)
+            current = self.devices.get(device)
+            if current is None or snapshot.get('sentAt', 0) >= current.get('sentAt', 0):
+                snapshot['receivedAt'] = time.time()
+                self.devices[device] = snapshot
+        return web.json_response({'ok': True, 'devices': len(self.devices)})
 
-                print("\n💡 Nhấn Ctrl+C để dừng chương trình")
+    @staticmethod
+    def validate_snapshot(snapshot: Dict) -> Optional[str]:
+        # fleet view/webhook gộp đọc thẳng các field này, sai kiểu là hỏng cả aggregator
+        sent_at = snapshot.get('sentAt', 0)
+        if isinstance(sent_at, bool) or not isinstance(sent_at, (int, float)):
+            return 'sentAt must be a number'
+        instances = snapshot.get('instances', [])
+        if not isinstance(instances, list) or not all(isinstance(item, dict) for item in instances):
+            return 'instances must be a list of objects'
+        for item in instances:
+            if not all(isinstance(item.get(key), str) for key in ('packageName', 'username', 'status')):
+                return 'instance packageName/username/status must be strings'
+        metrics = snapshot.get('metrics', {})
+        if not isinstance(metrics, dict):
+            return 'metrics must be an object'
+        for value in metrics.values():
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                return 'metrics values must be numbers or null'
+        return None
 
-            render_counter += 1
-            await asyncio.sleep(1)
+    async def handle_fleet(self, request: web.Request) -> web.Response:
+        if not self.authorized(request):
+            return web.json_response({'ok': False, 'error': 'unauthorized'}, status=401)
+        return web.json_response(self.fleet_view())
+
+    def fleet_view(self) -> Dict:
+        now = time.time()
+        devices = []
+        for name, snapshot in sorted(self.devices.items()):
+            instances = snapshot.get('instances', [])
+            devices.append({
+                'device': name,
+                'stale': now - snapshot['receivedAt'] > self.stale_sec,
+                'lastSeenSec': round(now - snapshot['receivedAt']),
+                'instances': len(instances),
+                'online': sum(1 for item in instances if str(item.get('status') or '').startswith('Online')),
+                'metrics': snapshot.get('metrics', {}),
+            })
+        return {
+            'devices': devices,
+            'totalInstances': sum(device['instances'] for device in devices),
+            'totalOnline': sum(device['online'] for device in devices),
+        }
+
+    def combined_snapshot(self) -> Optional[Dict]:
+        if not self.devices:
+            return None
+        view = self.fleet_view()
+        metrics = [device['metrics'] for device in view['devices'] if not device['stale']]
+
+        def total(key: str) -> float:
+            return sum(item.get(key) or 0 for item in metrics)
+
+        cpu_values = [item['cpuPercent'] for item in metrics if item.get('cpuPercent') is not None]
+        memory_total = total('memoryTotal')
+        disk_total = total('diskTotal')
+        instances = []
+        for name, snapshot in sorted(self.devices.items()):
+            for item in snapshot.get('instances', []):
+                instances.append(dict(item, packageName=f"{name}/{item.get('packageName', 'Unknown')}"))
+
+        return {
+            'systemInfo': {
+                "cpu_usage": f"{sum(cpu_values) / len(cpu_values):.1f}% (avg)" if cpu_values else "N/A",
+                "memory_used": f"{total('memoryUsed') / (1024**3):.2f}GB",
+                "memory_total": f"{memory_total / (1024**3):.2f}GB",
+                "memory_percent": f"{total('memoryUsed') * 100 / memory_total:.1f}%" if memory_total else "N/A",
+                "disk_used": f"{total('diskUsed') / (1024**3):.2f}GB",
+                "disk_total": f"{disk_total / (1024**3):.2f}GB",
+                "disk_percent": f"{total('diskUsed') * 100 / disk_total:.1f}%" if disk_total else "N/A",
+                "uptime": f"{len(metrics)}/{len(view['devices'])} devices online",
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            },
+            'instances': instances,
+        }
 
-    async def send_webhook_async(self):
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self.webhook_manager.send_webhook, self.instances)
+    def render(self) -> Group:
+        view = self.fleet_view()
+        table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+        table.add_column("Device", width=20)
+        table.add_column("Online", width=9)
+        table.add_column("CPU", width=7)
+        table.add_column("RAM", width=14)
+        table.add_column("Last seen", width=10)
+
+        for device in view['devices']:
+            metrics = device['metrics']
+            cpu = f"{metrics['cpuPercent']:.0f}%" if metrics.get('cpuPercent') is not None else "N/A"
+            if metrics.get('memoryTotal'):
+                ram = f"{metrics['memoryUsed'] / (1024**3):.1f}/{metrics['memoryTotal'] / (1024**3):.1f}GB"
+            else:
+                ram = "N/A"
+            last_seen = f"{device['lastSeenSec']}s" + (" ⚠️" if device['stale'] else "")
+            table.add_row(device['device'], f"{device['online']}/{device['instances']}", cpu, ram, last_seen)
+
+        header = (f"🛰️ Fleet aggregator http://{self.host}:{self.port} | 📱 Devices: {len(view['devices'])} | "
+                  f"🎮 Online: {view['totalOnline']}/{view['totalInstances']}")
+        return Group(Text(header), table)
+
+    async def run(self, render_sec: float = 5):
+        app = web.Application()
+        app.router.add_post('/snapshots', self.handle_snapshots)
+        app.router.add_get('/fleet', self.handle_fleet)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        metrics_sampler.start()
+
+        webhook_task = None
+        if self.webhook is not None:
+            webhook_task = asyncio.create_task(self.webhook.run_worker(self.http, self.combined_snapshot, self.settings))
 
+        try:
+            with Live(self.render(), console=console, auto_refresh=False) as live:
+                while True:
+                    try:
+                        self.evict_stale()
+                        live.update(self.render(), refresh=True)
+                    except Exception as e:
+                        console.print(f"[red]❌ Lỗi render fleet view: {e}[/red]")
+                    await asyncio.sleep(render_sec)
+        finally:
+            if webhook_task is not None:
+                webhook_task.cancel()
+                await asyncio.gather(webhook_task, return_exceptions=True)
+            await self.http.close()
+            await runner.cleanup()
 
 def signal_handler(signum, frame):
     print('\n\n🛑 Đang dừng chương trình...')
@@ -1867,17 +4403,85 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Multi-Instance Roblox Rejoin Tool")
+    subparsers = parser.add_subparsers(dest="command")
+
+    aggregator = subparsers.add_parser("aggregator", help="Chạy fleet aggregator nhận snapshot từ nhiều thiết bị")
+    aggregator.add_argument("--host", default="127.0.0.1",
+                            help="Địa chỉ lắng nghe, dùng 0.0.0.0 để nhận từ máy khác trong LAN (nên đặt --token)")
+    aggregator.add_argument("--port", type=int, default=8787)
+    aggregator.add_argument("--webhook-url", default=None, help="Discord webhook cho báo cáo gộp của cả fleet")
+    aggregator.add_argument("--interval", type=int, default=60, help="Chu kỳ webhook gộp (phút)")
+    aggregator.add_argument("--stale-sec", type=float, default=180, help="Coi thiết bị mất kết nối sau số giây này")
+    aggregator.add_argument("--evict-sec", type=float, default=3600, help="Xoá thiết bị khỏi fleet sau số giây này")
+    aggregator.add_argument("--token", default=os.environ.get("REJOIN_AGGREGATOR_TOKEN"),
+                            help="Token dùng chung, thiết bị đặt aggregatorToken giống vậy trong tool_settings.json")
+
+    analyze = subparsers.add_parser("analyze", help="Phân tích event log: uptime, relaunch/giờ, thời gian rejoin")
+    analyze.add_argument("paths", nargs="*", help="File event log (mặc định events.jsonl và các file đã xoay)")
+    analyze.add_argument("--since-hours", type=float, default=None, help="Chỉ tính event trong N giờ gần nhất")
+    analyze.add_argument("--top", type=int, default=10, help="Số account tệ nhất cần hiển thị (0 = tất cả)")
+    analyze.add_argument("--gap-cap-sec", type=float, default=600,
+                         help="Khoảng trống tối đa giữa 2 check được tính là thời gian quan sát")
+    analyze.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+
+    parser.add_argument("--run", action="store_true", help="Chạy headless: bỏ qua menu, vào thẳng auto rejoin")
+    parser.add_argument("--packages", default="all",
+                        help="Package cần chạy, cách nhau bởi dấu phẩy (mặc định: all)")
+    parser.add_argument("--config", default=str(CONFIG_PATH), help="Đường dẫn multi_configs.json")
+
+    return parser.parse_args(argv)
+
+def run_analyze(args: argparse.Namespace):
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    analyzer = EventLogAnalyzer(args.gap_cap_sec, since)
+
+    if args.paths:
+        files = [Path(path) for path in args.paths]
+    else:
+        settings = Utils.load_tool_settings()
+        log_path = Path(settings['eventLogPath']) if settings['eventLogPath'] else EVENT_LOG_PATH
+        files = EventLogAnalyzer.log_files(log_path)
+
+    if not files:
+        print("❌ Không tìm thấy event log nào!")
+        return
+    for path in files:
+        analyzer.feed_file(path)
+
+    rows = analyzer.report()
+    if args.json:
+        print(json.dumps(rows[:args.top] if args.top else rows, ensure_ascii=False, indent=2))
+    else:
+        EventLogAnalyzer.render(rows, args.top)
+
+
 async def main():
-    import signal
     signal.signal(signal.SIGINT, signal_handler)
+
+    args = parse_args()
+    if args.command == "analyze":
+        run_analyze(args)
+        return
+    if args.command == "aggregator":
+        aggregator = FleetAggregator(Utils.load_tool_settings(), args.host, args.port, args.webhook_url,
+                                     args.interval, args.stale_sec, args.evict_sec, args.token)
+        await aggregator.run()
+        return
     
+    tool = MultiRejoinTool()
     try:
-        tool = MultiRejoinTool()
-        await tool.start()
+        if args.run:
+            await tool.run_headless(args.packages, Path(args.config))
+        else:
+            await tool.start()
     except KeyboardInterrupt:
         print('\n\n🛑 Đang dừng chương trình...')
         print('👋 Cảm ơn bạn đã sử dụng Rejoin Ngan ❤')
         sys.exit(0)
+    finally:
+        await tool.http.close()
 
 
 if __name__ == "__main__":